@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+
+class Backtester:
+    def __init__(self, cost_bps=5.0, execution='open', long_only=False, threshold=None, max_weight=None, annualize=252):
+        # signals are read at the close of day t. execution='open' trades at
+        # the next open, execution='close' at the same close. weights are the
+        # signal scaled to unit gross exposure per day, so a 0/1 prediction
+        # like tom_close_bin is an equal-weight long book. signals with
+        # |s| < threshold are treated as flat; max_weight caps each name
+        if execution not in ('open', 'close'):
+            raise ValueError("execution must be 'open' or 'close'")
+        self.cost_bps = cost_bps
+        self.execution = execution
+        self.long_only = long_only
+        self.threshold = threshold
+        self.max_weight = max_weight
+        self.annualize = annualize
+        self.utils = self.Utils()
+
+    ##############################
+
+    class Utils:
+        def grid_(self, frame, dates, tickers, column, rows=None, cols=None):
+            # scatters a long (ticker, date, column) frame onto a
+            # dates x tickers array with hash lookups on int64 days and
+            # tickers; cells with no row are nan
+            if rows is None:
+                rows = dates.get_indexer(frame['date'].to_numpy(dtype='datetime64[ns]').view('int64'))
+                cols = tickers.get_indexer(frame['ticker'].to_numpy())
+            out = np.full((len(dates), len(tickers)), np.nan)
+            keep = (rows >= 0) & (cols >= 0)
+            out[rows[keep], cols[keep]] = frame[column].to_numpy(dtype='float64')[keep]
+            return out
+
+        def shift_(self, x, n=1):
+            out = np.zeros_like(x)
+            out[n:] = x[:-n]
+            return out
+
+        def drawdown_(self, equity):
+            return equity / np.maximum.accumulate(equity) - 1
+
+    ##############################
+
+    def panel(self, prices, signal, column='signal'):
+        # prices is the cleaned aggs schema (ticker, date, open, close, ...);
+        # signal is either long (ticker, date, column) or already wide with
+        # dates on the index and tickers as columns
+        rows, days = pd.factorize(prices['date'].to_numpy(dtype='datetime64[ns]').view('int64'), sort=True)
+        cols, tickers = pd.factorize(prices['ticker'].to_numpy(), sort=True)
+        days, tickers = pd.Index(days), pd.Index(tickers, name='ticker')
+        panel = {i: self.utils.grid_(prices, days, tickers, i, rows, cols) for i in ['open', 'close'] if i in prices.columns}
+        dates = pd.DatetimeIndex(days.to_numpy().view('datetime64[ns]'), name='date')
+        if 'ticker' in signal.columns:
+            panel['signal'] = self.utils.grid_(signal, days, tickers, column)
+        else:
+            wide = signal.set_axis(pd.to_datetime(signal.index), axis=0).reindex(index=dates, columns=tickers)
+            panel['signal'] = wide.to_numpy(dtype='float64')
+        return dates, tickers, panel
+
+    def weights_(self, signal, tradable):
+        s = np.where(tradable, np.nan_to_num(signal, nan=0.0), 0.0)
+        if self.threshold is not None:
+            s = np.where(np.abs(s) >= self.threshold, s, 0.0)
+        if self.long_only:
+            s = np.maximum(s, 0.0)
+        gross = np.abs(s).sum(axis=1, keepdims=True)
+        w = np.divide(s, gross, out=np.zeros_like(s), where=gross > 0)
+        if self.max_weight is not None:
+            w = np.clip(w, -self.max_weight, self.max_weight)
+        return w
+
+    def run_arrays(self, signal, close, open_=None):
+        # core of the engine on dates x tickers arrays; returns per-day
+        # arrays plus the held positions. holdings[t] is the book carried
+        # through day t, so day t's return uses only signals up to t-1
+        # (open) or t-1's close (close)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prev_close = self.utils.shift_(close)
+            prev_close[0] = np.nan
+            w = self.weights_(signal, ~np.isnan(close))
+            holdings = self.utils.shift_(w)
+            if self.execution == 'open':
+                if open_ is None:
+                    raise ValueError("execution='open' needs open prices")
+                overnight = np.nan_to_num(open_ / prev_close - 1, nan=0.0, posinf=0.0, neginf=0.0)
+                intraday = np.nan_to_num(close / open_ - 1, nan=0.0, posinf=0.0, neginf=0.0)
+                # yesterday's book rides the gap, today's book is in from the open
+                gross = (self.utils.shift_(holdings) * overnight).sum(axis=1) + (holdings * intraday).sum(axis=1)
+            else:
+                ret = np.nan_to_num(close / prev_close - 1, nan=0.0, posinf=0.0, neginf=0.0)
+                gross = (holdings * ret).sum(axis=1)
+        turnover = np.abs(holdings - self.utils.shift_(holdings)).sum(axis=1)
+        cost = turnover * self.cost_bps / 1e4
+        net = gross - cost
+        equity = np.cumprod(1 + net)
+        return {
+            'gross': gross,
+            'cost': cost,
+            'net': net,
+            'turnover': turnover,
+            'exposure': np.abs(holdings).sum(axis=1),
+            'equity': equity,
+            'drawdown': self.utils.drawdown_(equity)
+        }, holdings
+
+    def run(self, prices, signal, column='signal'):
+        dates, tickers, panel = self.panel(prices, signal, column)
+        daily, holdings = self.run_arrays(panel['signal'], panel['close'], panel.get('open'))
+        # the held book stays on the engine; a frame in daily.attrs would
+        # make pandas raise when it compares attrs on print or concat
+        self.positions_ = pd.DataFrame(holdings, index=dates, columns=tickers)
+        return pd.DataFrame(daily, index=dates)
+
+    def summary(self, daily):
+        net = daily['net'].to_numpy()
+        years = len(net) / self.annualize
+        vol = net.std(ddof=1) * np.sqrt(self.annualize) if len(net) > 1 else np.nan
+        total = daily['equity'].iloc[-1] - 1
+        return {
+            'total_return': total,
+            'cagr': (1 + total) ** (1 / years) - 1 if years > 0 and total > -1 else np.nan,
+            'ann_vol': vol,
+            'sharpe': net.mean() * self.annualize / vol if vol and vol > 0 else np.nan,
+            'max_drawdown': daily['drawdown'].min(),
+            'avg_turnover': daily['turnover'].mean(),
+            'total_cost': daily['cost'].sum()
+        }
+
+    def run_table(self, db, signal_table, column='signal', price_table='pricing_data', tickers=None):
+        # reads the signal column and stored bars from a DataBaseClient
+        where = ""
+        params = None
+        if tickers is not None:
+            where = f" WHERE ticker IN ({', '.join('?' * len(tickers))})"
+            params = list(tickers)
+        signal = db.data_query(f"SELECT ticker, date, {column} FROM {signal_table}{where}", params)
+        prices = db.data_query(f"SELECT ticker, date, open, close FROM {price_table}{where}", params)
+        return self.run(prices, signal, column)
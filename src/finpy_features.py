@@ -0,0 +1,447 @@
+import numpy as np
+import pandas as pd
+
+from finpy_main import DataBaseClient
+from Lists import fred_econ
+
+
+class AsofAligner:
+    # days between a fred observation date and the value being public; fred
+    # stamps observations with the period start, so a quarter's gdp isn't
+    # known until roughly four months after its date
+    publication_lags = {
+        'daily': 1,
+        'weekly': 7,
+        'month': 45,
+        'quarter': 120
+    }
+
+    def __init__(self, lags=None):
+        # lags is None (align on observation date), 'auto' (lag by the
+        # frequency listed in Lists.fred_econ), an int of days for every
+        # series or a dict of days per series ticker
+        self.lags = lags
+        self.utils = self.Utils()
+
+    class Utils:
+        def __init__(self):
+            pass
+
+        def long_to_series_(self, macro, series):
+            # accepts the long all_data layout (date, value, ticker) or a wide
+            # panel like FredClient.get_panel returns
+            out = {}
+            if 'ticker' in macro.columns and 'value' in macro.columns:
+                macro = macro[macro['ticker'].isin(series)]
+                for ticker, group in macro.groupby('ticker', sort=False):
+                    out[ticker] = (group['date'].to_numpy(dtype='datetime64[ns]'), group['value'].to_numpy(dtype='float64'))
+            else:
+                dates = macro.index.to_numpy(dtype='datetime64[ns]')
+                for ticker in series:
+                    if ticker in macro.columns:
+                        out[ticker] = (dates, macro[ticker].to_numpy(dtype='float64'))
+            return out
+
+    ##############################
+
+    def lag_days_(self, ticker):
+        if self.lags is None:
+            return 0
+        if self.lags == 'auto':
+            frequency = {i['ticker']: i['frequency'] for i in fred_econ}.get(ticker)
+            return self.publication_lags.get(frequency, 0)
+        if isinstance(self.lags, dict):
+            return self.lags.get(ticker, 0)
+        return self.lags
+
+    def calendar(self, prices):
+        return np.unique(prices['date'].to_numpy(dtype='datetime64[ns]'))
+
+    def align_calendar(self, calendar, macro, series):
+        # one searchsorted per series over the whole trading calendar; the
+        # result is a (days x series) float64 block of values known each day
+        data = self.utils.long_to_series_(macro, series)
+        values = np.full((len(calendar), len(series)), np.nan, dtype='float64')
+        for j, ticker in enumerate(series):
+            if ticker not in data:
+                continue
+            dates, observed = data[ticker]
+            keep = ~np.isnan(observed)
+            dates = dates[keep]
+            observed = observed[keep]
+            order = np.argsort(dates, kind='stable')
+            known = dates[order] + np.timedelta64(self.lag_days_(ticker), 'D')
+            idx = np.searchsorted(known, calendar, side='right') - 1
+            values[:, j] = np.where(idx >= 0, observed[order][np.maximum(idx, 0)], np.nan)
+        return values
+
+    def align(self, prices, macro, series=None):
+        # prices is any long frame with a date column (any number of tickers);
+        # series defaults to every ticker in Lists.fred_econ. each row gets the
+        # latest value of each series that was public on its date
+        if series is None:
+            series = [i['ticker'] for i in fred_econ]
+        series = [i['ticker'] if isinstance(i, dict) else i for i in series]
+        calendar = self.calendar(prices)
+        values = self.align_calendar(calendar, macro, series)
+        rows = np.searchsorted(calendar, prices['date'].to_numpy(dtype='datetime64[ns]'))
+        aligned = pd.DataFrame(values[rows], index=prices.index, columns=[i.lower() for i in series])
+        return pd.concat([prices, aligned], axis=1)
+
+
+class FundamentalsPanel:
+    def __init__(self, ticker_col='symbol', lag=0):
+        # statements keep the filing date as 'date' (see the *_data_clean_
+        # cleaners) and name the ticker 'symbol'; lag delays each filing by
+        # that many days before it shows up in the panel
+        self.ticker_col = ticker_col
+        self.lag = lag
+
+    def build(self, prices, statements, columns=None):
+        # every (ticker, trading day) row in prices gets the numeric fields of
+        # the latest statement filed on or before that day, for all tickers in
+        # one pass: both sides are keyed as (ticker code << 32 | epoch day)
+        # and resolved with a single searchsorted
+        if columns is None:
+            columns = [i for i in statements.select_dtypes('number').columns if i != 'year']
+        codes, _ = pd.factorize(pd.concat([
+            prices['ticker'].str.upper(),
+            statements[self.ticker_col].str.upper()
+        ], ignore_index=True))
+        price_codes = codes[:len(prices)].astype('int64')
+        statement_codes = codes[len(prices):].astype('int64')
+        price_days = prices['date'].to_numpy(dtype='datetime64[D]').astype('int64')
+        statement_days = statements['date'].to_numpy(dtype='datetime64[D]').astype('int64') + self.lag
+        statement_keys = (statement_codes << 32) | statement_days
+        order = np.argsort(statement_keys, kind='stable')
+        statement_keys = statement_keys[order]
+        idx = np.searchsorted(statement_keys, (price_codes << 32) | price_days, side='right') - 1
+        found = idx >= 0
+        found[found] = statement_codes[order][idx[found]] == price_codes[found]
+        take = order[np.maximum(idx, 0)]
+        values = statements[columns].to_numpy(dtype='float64')[take]
+        values[~found] = np.nan
+        panel = pd.DataFrame(values, index=prices.index, columns=columns)
+        filing = statements['date'].to_numpy(dtype='datetime64[ns]')[take]
+        filing[~found] = np.datetime64('NaT')
+        panel.insert(0, 'filing_date', filing)
+        panel.insert(0, 'ticker', prices['ticker'].to_numpy())
+        panel.insert(0, 'date', prices['date'].to_numpy())
+        return panel
+
+    def build_table(self, db, statement_tables, price_table='pricing_data', table_name='fundamentals_panel'):
+        # aligns one or more stored statement tables onto the stored trading
+        # days and caches the panel in the database keyed by (ticker, date).
+        # tables are filed separately, so with more than one each keeps its
+        # own filing_date_<table> next to the fields it contributed
+        if isinstance(statement_tables, str):
+            statement_tables = [statement_tables]
+        prices = db.data_query(f"SELECT ticker, date FROM {price_table} ORDER BY ticker, date")
+        panel = None
+        for table in statement_tables:
+            part = self.build(prices, db.data_query(f"SELECT * FROM {table}"))
+            if len(statement_tables) > 1:
+                part = part.rename(columns={'filing_date': f'filing_date_{table}'})
+            if panel is None:
+                panel = part
+            else:
+                # later statements only add fields the panel doesn't have yet
+                new = [i for i in part.columns if i not in panel.columns]
+                panel = pd.concat([panel, part[new]], axis=1)
+        db.upsert(panel, table_name, key=['ticker', 'date'])
+        return panel
+
+    def get(self, db, statement_tables, price_table='pricing_data', table_name='fundamentals_panel', refresh=False):
+        if refresh or table_name not in db.get_table_names()['name'].tolist():
+            return self.build_table(db, statement_tables, price_table, table_name)
+        return db.data_query(f"SELECT * FROM {table_name}")
+
+
+class FeatureEngine:
+    feature_names = ['ret', 'rvol', 'atr', 'z', 'vratio']
+
+    def __init__(self, windows=(5, 20, 60), features=None, annualize=252):
+        # ret_n   close / close n bars back - 1
+        # rvol_n  std of daily log returns over n bars, annualized
+        # atr_n   mean true range over n bars
+        # z_n     (close - n bar mean) / n bar std
+        # vratio_n volume / n bar mean volume
+        self.windows = list(windows)
+        self.features = list(features or self.feature_names)
+        self.annualize = annualize
+        self.utils = self.Utils()
+
+    class Utils:
+        def __init__(self):
+            pass
+
+        def group_starts_(self, codes):
+            # index of the first row of each row's ticker (rows sorted by ticker)
+            new = np.r_[True, codes[1:] != codes[:-1]]
+            return np.maximum.accumulate(np.where(new, np.arange(len(codes)), 0))
+
+        def lag_(self, x, starts, n):
+            out = np.full(len(x), np.nan)
+            src = np.arange(len(x)) - n
+            ok = src >= starts
+            out[ok] = x[src[ok]]
+            return out
+
+        def rolling_sum_(self, x, starts, n):
+            # window sums from one cumulative sum; windows that cross into the
+            # previous ticker or hold a NaN come back NaN
+            missing = np.isnan(x)
+            sums = np.r_[0.0, np.cumsum(np.where(missing, 0.0, x))]
+            counts = np.r_[0, np.cumsum(missing)]
+            i = np.arange(len(x))
+            lo = np.maximum(i + 1 - n, 0)
+            ok = (i + 1 - n >= starts) & (counts[i + 1] == counts[lo])
+            return np.where(ok, sums[i + 1] - sums[lo], np.nan)
+
+        def rolling_mean_std_(self, x, starts, groups, n):
+            # centred on each ticker's mean first so the sum of squares doesn't
+            # swamp the variance on high priced names
+            valid = ~np.isnan(x)
+            centre = np.bincount(groups, np.where(valid, x, 0.0)) / np.maximum(np.bincount(groups, valid), 1)
+            x = x - centre[groups]
+            s1 = self.rolling_sum_(x, starts, n)
+            s2 = self.rolling_sum_(x * x, starts, n)
+            mean = s1 / n
+            var = np.maximum(s2 - s1 * mean, 0.0) / (n - 1)
+            return mean + centre[groups], np.sqrt(var)
+
+    ##############################
+
+    def prepare_(self, prices):
+        # sorted by (ticker, date) on integer keys; groups are 0..k-1 codes
+        codes = pd.factorize(prices['ticker'], sort=True)[0]
+        order = np.lexsort((prices['date'].to_numpy(dtype='datetime64[ns]').view('int64'), codes))
+        prices = prices.iloc[order].reset_index(drop=True)
+        groups = codes[order]
+        return prices, self.utils.group_starts_(groups), groups
+
+    def build(self, prices):
+        # prices is the cleaned aggs schema (ticker, date, open, high, low,
+        # close, volume, ...) for any number of tickers; every feature is a
+        # handful of whole-array numpy operations, with no per-ticker loop
+        prices, starts, groups = self.prepare_(prices)
+        close = prices['close'].to_numpy(dtype='float64')
+        prev_close = self.utils.lag_(close, starts, 1)
+        out = {'date': prices['date'].to_numpy(), 'ticker': prices['ticker'].to_numpy()}
+        if 'rvol' in self.features:
+            log_ret = np.log(close / prev_close)
+        if 'atr' in self.features and {'high', 'low'} <= set(prices.columns):
+            high = prices['high'].to_numpy(dtype='float64')
+            low = prices['low'].to_numpy(dtype='float64')
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        if 'vratio' in self.features and 'volume' in prices.columns:
+            volume = prices['volume'].to_numpy(dtype='float64')
+        for n in self.windows:
+            if 'ret' in self.features:
+                out[f'ret_{n}'] = close / self.utils.lag_(close, starts, n) - 1
+            if 'rvol' in self.features:
+                out[f'rvol_{n}'] = self.utils.rolling_mean_std_(log_ret, starts, groups, n)[1] * np.sqrt(self.annualize)
+            if 'atr' in self.features and {'high', 'low'} <= set(prices.columns):
+                out[f'atr_{n}'] = self.utils.rolling_sum_(true_range, starts, n) / n
+            if 'z' in self.features:
+                mean, std = self.utils.rolling_mean_std_(close, starts, groups, n)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    out[f'z_{n}'] = (close - mean) / std
+            if 'vratio' in self.features and 'volume' in prices.columns:
+                out[f'vratio_{n}'] = volume / (self.utils.rolling_sum_(volume, starts, n) / n)
+        return pd.DataFrame(out)
+
+    def build_table(self, db, price_table='pricing_data', sink=None, table_name='features'):
+        # sink defaults to the source database; a ParquetClient gives the
+        # columnar feature table the model code reads a few columns from
+        features = self.build(db.data_query(f"SELECT * FROM {price_table}"))
+        sink = sink or db
+        if isinstance(sink, DataBaseClient):
+            sink.upsert(features, table_name, key=['ticker', 'date'])
+        else:
+            sink.data_add(features, table_name)
+        return features
+
+    ##############################
+
+    # incremental updates keep, per ticker, ring buffers of the last
+    # max(windows) + 1 bars and running sums / sums of squares / NaN counts
+    # for every window, so a new bar costs O(windows) per ticker instead of
+    # a pass over the whole history
+    state_series = ['close', 'log_ret', 'true_range', 'volume']
+
+    def init_state(self, prices):
+        # only the last max(windows) + 1 bars of each ticker are replayed
+        state = self.empty_state_()
+        prices, starts, _ = self.prepare_(prices)
+        rank = np.arange(len(prices)) - starts
+        size = np.bincount(starts)[starts]
+        tail = prices[rank >= size - (max(self.windows) + 1)]
+        self.update(state, tail, emit=False)
+        return state
+
+    def empty_state_(self):
+        ring = max(self.windows) + 1
+        state = {
+            'tickers': np.array([], dtype=object),
+            'last_date': np.array([], dtype='datetime64[ns]'),
+            'count': np.zeros(0, dtype='int64'),
+            'pos': np.zeros(0, dtype='int64'),
+            'centre': np.zeros(0),
+            'steps': 0
+        }
+        for name in self.state_series:
+            state[name] = np.zeros((0, ring))
+            state[f's_{name}'] = np.zeros((0, len(self.windows)))
+            state[f'q_{name}'] = np.zeros((0, len(self.windows)))
+            state[f'n_{name}'] = np.zeros((0, len(self.windows)), dtype='int64')
+        return state
+
+    def add_tickers_(self, state, tickers, first_close):
+        extra = len(tickers)
+        state['tickers'] = np.concatenate([state['tickers'], np.array(tickers, dtype=object)])
+        state['last_date'] = np.concatenate([state['last_date'], np.full(extra, np.datetime64('NaT'), dtype='datetime64[ns]')])
+        state['count'] = np.concatenate([state['count'], np.zeros(extra, dtype='int64')])
+        state['pos'] = np.concatenate([state['pos'], np.zeros(extra, dtype='int64')])
+        state['centre'] = np.concatenate([state['centre'], first_close])
+        for key, value in state.items():
+            if isinstance(value, np.ndarray) and value.ndim == 2:
+                state[key] = np.concatenate([value, np.zeros((extra, value.shape[1]), dtype=value.dtype)])
+
+    def step_(self, state, t, bars):
+        # one new bar for each ticker index in t (indices are unique)
+        ring = state['close'].shape[1]
+        has_prev = state['count'][t] > 0
+        prev = np.where(has_prev, state['close'][t, state['pos'][t]], np.nan)
+        close = bars['close']
+        high = bars.get('high', np.full(len(t), np.nan))
+        low = bars.get('low', np.full(len(t), np.nan))
+        new = {
+            'close': close,
+            'log_ret': np.log(close / prev),
+            'true_range': np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev))),
+            'volume': bars.get('volume', np.full(len(t), np.nan))
+        }
+        pos = np.where(has_prev, (state['pos'][t] + 1) % ring, 0)
+        count = state['count'][t] + 1
+        centre = {'close': state['centre'][t]}
+        for name in self.state_series:
+            x = new[name] - centre.get(name, 0.0)
+            x_missing = np.isnan(x)
+            x = np.where(x_missing, 0.0, x)
+            for k, n in enumerate(self.windows):
+                leaving = state[name][t, (pos - n) % ring] - centre.get(name, 0.0)
+                exists = count > n
+                leave_missing = exists & np.isnan(leaving)
+                leaving = np.where(exists & ~leave_missing, leaving, 0.0)
+                state[f's_{name}'][t, k] += x - leaving
+                state[f'q_{name}'][t, k] += x * x - leaving * leaving
+                state[f'n_{name}'][t, k] += x_missing.astype('int64') - leave_missing
+            state[name][t, pos] = new[name]
+        state['pos'][t] = pos
+        state['count'][t] = count
+        state['steps'] += 1
+
+    def features_(self, state, t, bars, columns):
+        ring = state['close'].shape[1]
+        pos = state['pos'][t]
+        count = state['count'][t]
+        close = bars['close']
+        out = {}
+
+        def window_(name, k, n, centred=0.0):
+            ok = (count >= n) & (state[f'n_{name}'][t, k] == 0)
+            s = state[f's_{name}'][t, k]
+            q = state[f'q_{name}'][t, k]
+            mean = s / n
+            std = np.sqrt(np.maximum(q - s * mean, 0.0) / (n - 1))
+            return np.where(ok, mean + centred, np.nan), np.where(ok, std, np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for k, n in enumerate(self.windows):
+                if 'ret' in self.features:
+                    back = state['close'][t, (pos - n) % ring]
+                    out[f'ret_{n}'] = np.where(count > n, close / back - 1, np.nan)
+                if 'rvol' in self.features:
+                    out[f'rvol_{n}'] = window_('log_ret', k, n)[1] * np.sqrt(self.annualize)
+                if 'atr' in self.features and {'high', 'low'} <= columns:
+                    out[f'atr_{n}'] = window_('true_range', k, n)[0]
+                if 'z' in self.features:
+                    mean, std = window_('close', k, n, state['centre'][t])
+                    out[f'z_{n}'] = (close - mean) / std
+                if 'vratio' in self.features and 'volume' in columns:
+                    out[f'vratio_{n}'] = bars['volume'] / window_('volume', k, n)[0]
+        return out
+
+    def resync_(self, state):
+        # rebuilds every running sum from the ring buffers to shed the float
+        # drift that add/subtract accumulates over many updates
+        ring = state['close'].shape[1]
+        for name in self.state_series:
+            centre = state['centre'][:, None] if name == 'close' else 0.0
+            for k, n in enumerate(self.windows):
+                back = np.arange(n)[None, :]
+                values = state[name][np.arange(len(state['pos']))[:, None], (state['pos'][:, None] - back) % ring] - centre
+                present = back < state['count'][:, None]
+                missing = present & np.isnan(values)
+                values = np.where(present & ~missing, values, 0.0)
+                state[f's_{name}'][:, k] = values.sum(axis=1)
+                state[f'q_{name}'][:, k] = (values * values).sum(axis=1)
+                state[f'n_{name}'][:, k] = missing.sum(axis=1)
+        state['steps'] = 0
+
+    def update(self, state, new_bars, emit=True, resync_every=250):
+        # new_bars uses the same schema as build; bars on or before a
+        # ticker's last seen date are ignored, so replays are harmless
+        new_bars, starts, _ = self.prepare_(new_bars)
+        index = {ticker: i for i, ticker in enumerate(state['tickers'])}
+        unseen = pd.unique(new_bars['ticker'][~new_bars['ticker'].isin(index)])
+        if len(unseen):
+            first = new_bars.drop_duplicates('ticker').set_index('ticker').loc[unseen, 'close'].to_numpy(dtype='float64')
+            self.add_tickers_(state, unseen, first)
+            index = {ticker: i for i, ticker in enumerate(state['tickers'])}
+        t_all = new_bars['ticker'].map(index).to_numpy()
+        dates = new_bars['date'].to_numpy(dtype='datetime64[ns]')
+        last = state['last_date'][t_all]
+        fresh = np.isnat(last) | (dates > last)
+        columns = set(new_bars.columns)
+        rank = np.arange(len(new_bars)) - starts
+        arrays = {i: new_bars[i].to_numpy(dtype='float64') for i in ['close', 'high', 'low', 'volume'] if i in columns}
+        frames = []
+        for r in range(rank.max() + 1 if len(rank) else 0):
+            rows = np.flatnonzero((rank == r) & fresh)
+            if not len(rows):
+                continue
+            t = t_all[rows]
+            bars = {i: v[rows] for i, v in arrays.items()}
+            self.step_(state, t, bars)
+            state['last_date'][t] = dates[rows]
+            if emit:
+                out = {'date': dates[rows], 'ticker': new_bars['ticker'].to_numpy()[rows]}
+                out.update(self.features_(state, t, bars, columns))
+                frames.append(pd.DataFrame(out))
+        if state['steps'] >= resync_every or not emit:
+            self.resync_(state)
+        if not emit:
+            return None
+        if not frames:
+            return pd.DataFrame(columns=['date', 'ticker'])
+        return pd.concat(frames, ignore_index=True).sort_values(['ticker', 'date'], ignore_index=True)
+
+    def update_table(self, state, new_bars, sink, table_name='features'):
+        features = self.update(state, new_bars)
+        if not features.empty:
+            if isinstance(sink, DataBaseClient):
+                sink.upsert(features, table_name, key=['ticker', 'date'])
+            else:
+                sink.data_add(features, table_name)
+        return features
+
+    def save_state(self, state, path):
+        np.savez(path, **state)
+
+    def load_state(self, path):
+        with np.load(path, allow_pickle=True) as data:
+            state = {i: data[i] for i in data.files}
+        state['steps'] = int(state['steps'])
+        return state
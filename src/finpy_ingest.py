@@ -0,0 +1,598 @@
+import argparse
+import heapq
+import itertools
+import queue
+import threading
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from finpy_main import DataBaseClient, FmpClient, FredClient, OptionsClient, ResponseCache
+from Lists import fred_econ, indecies, forex_pairs, snp_500_by_market_cap
+
+
+class IngestionJob:
+    # dataset -> provider, table, upsert key, universe and client method;
+    # table names follow the ones data_collection.ipynb already writes
+    datasets = {
+        'fred': {'provider': 'fred', 'table': 'all_data', 'key': ['ticker', 'date'], 'universe': 'fred_econ', 'method': 'get_series'},
+        'pricing': {'provider': 'fmp', 'table': 'pricing_data', 'key': ['ticker', 'date'], 'universe': 'snp', 'method': 'get_aggs'},
+        'index': {'provider': 'fmp', 'table': 'index', 'key': ['ticker', 'date'], 'universe': 'indecies', 'method': 'get_aggs_index'},
+        'forex': {'provider': 'fmp', 'table': 'forex', 'key': ['ticker', 'date'], 'universe': 'forex_pairs', 'method': 'get_aggs_forex'},
+        'market_cap': {'provider': 'fmp', 'table': 'market_cap', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_market_cap_history'},
+        'dividend': {'provider': 'fmp', 'table': 'dividend', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_dividend'},
+        'income_a': {'provider': 'fmp', 'table': 'income_a', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_income_statement_a'},
+        'income_q': {'provider': 'fmp', 'table': 'income_q', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_income_statement_q'},
+        'balance_a': {'provider': 'fmp', 'table': 'balance_a', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_balance_sheet_a'},
+        'balance_q': {'provider': 'fmp', 'table': 'balance_q', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_balance_sheet_q'},
+        'cash_a': {'provider': 'fmp', 'table': 'cash_a', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_cash_flow_a'},
+        'cash_q': {'provider': 'fmp', 'table': 'cash_q', 'key': ['symbol', 'date'], 'universe': 'snp', 'method': 'get_cash_flow_q'},
+        'options_contracts': {'provider': 'polygon', 'table': 'options_contracts', 'key': ['contract_ticker'], 'universe': 'snp', 'method': 'get_contracts_from_ticker'},
+        'options_aggs': {'provider': 'polygon', 'table': 'options_aggs', 'key': ['contract_ticker', 'date'], 'universe': 'options_contracts', 'method': 'get_aggs_options', 'deps': ['options_contracts']}
+    }
+    # tasks other datasets wait on go first within their provider's pool
+    priorities = {'snp_companies': 10, 'options_contracts': 5, 'pricing': 1}
+    # aggs tables only ask for bars after the latest stored date per ticker
+    incremental = ['pricing', 'index', 'forex', 'options_aggs']
+    # per-contract high-water marks, shared with OptionsClient.sync_aggs_options
+    watermark_table = 'options_sync'
+
+    def __init__(self, db, fmp=None, fred=None, options=None, workers=4, limit=None, checkpoint_table='ingest_checkpoints'):
+        # the clients share the module-level rate limiters, so datasets on the
+        # same provider draw from one quota however many run at once. sqlite
+        # writes and checkpoints stay on the calling thread; only fetches run
+        # in the scheduler's provider pools
+        self.db = db
+        self.clients = {'fmp': fmp, 'fred': fred, 'polygon': options}
+        self.workers = workers
+        self.limit = limit
+        self.checkpoint_table = checkpoint_table
+        self.windows_ = {}
+        self.db.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {checkpoint_table} (
+                dataset TEXT,
+                ticker TEXT,
+                status TEXT,
+                rows INTEGER,
+                error TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (dataset, ticker)
+            )""")
+        self.db.conn.commit()
+
+    ##############################
+
+    def universe_(self, dataset, snp=None):
+        # snp overrides the Lists.py S&P symbols (e.g. get_snp_companies)
+        name = self.datasets[dataset]['universe']
+        tickers = {
+            'fred_econ': [i['ticker'] for i in fred_econ],
+            'indecies': list(indecies),
+            'forex_pairs': list(forex_pairs),
+            'snp': list(snp) if snp is not None else [i['symbol'] for i in snp_500_by_market_cap]
+        }.get(name)
+        if name == 'options_contracts':
+            # every stored contract of the universe's underlyings
+            if 'options_contracts' not in self.db.get_table_names()['name'].tolist():
+                return []
+            underlyings = [i.upper() for i in self.universe_('options_contracts', snp)]
+            marks = ', '.join('?' * len(underlyings))
+            df = self.db.data_query(f"SELECT DISTINCT contract_ticker FROM options_contracts WHERE ticker IN ({marks})", underlyings)
+            return df['contract_ticker'].tolist()
+        return tickers[:self.limit] if self.limit is not None else tickers
+
+    def fetcher_(self, dataset):
+        spec = self.datasets[dataset]
+        client = self.clients[spec['provider']]
+        if client is None:
+            raise ValueError(f"dataset '{dataset}' needs a {spec['provider']} client")
+        method = getattr(client, spec['method'])
+        if dataset == 'fred':
+            def fetch_(ticker):
+                return method(ticker).assign(ticker=ticker)
+        elif dataset == 'options_aggs':
+            today = pd.Timestamp.today().normalize()
+
+            def fetch_(contract):
+                # windows_ is filled when the contracts are expanded, after
+                # options_contracts has stored this run's lists
+                last, expiration, complete = self.windows_.get(contract, (None, None, False))
+                if complete:
+                    return pd.DataFrame()
+                finish = today if expiration is None else min(today, expiration)
+                start = pd.Timestamp('2000-01-01') if last is None else last + pd.Timedelta(days=1)
+                if start > finish:
+                    return pd.DataFrame()
+                df = method(contract, start.strftime('%Y-%m-%d'), finish.strftime('%Y-%m-%d'))
+                if isinstance(df, str):
+                    # no trades in the window is not a failure
+                    return pd.DataFrame() if df.startswith('ERROR! dictionary empty') else df
+                return df[df['date'] > last] if last is not None else df
+        elif dataset in self.incremental:
+            last_dates = self.db.get_last_dates(spec['table'])
+            today = pd.Timestamp.today().normalize()
+
+            def fetch_(ticker):
+                last = last_dates.get(ticker.upper())
+                if last is not None and last >= today:
+                    return pd.DataFrame()
+                start = '2000-01-01' if last is None else (last + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+                df = method(ticker, start, today.strftime('%Y-%m-%d'))
+                if isinstance(df, str) and last is not None and df.startswith('ERROR! no bars in range'):
+                    # nothing new since the last run (weekend, holiday); any
+                    # other error is passed on and retried next run
+                    return pd.DataFrame()
+                return df
+        else:
+            fetch_ = method
+        return fetch_
+
+    def checkpoint_(self, dataset, ticker, status, rows=0, error=None):
+        self.db.conn.execute(
+            f"""INSERT INTO {self.checkpoint_table} (dataset, ticker, status, rows, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dataset, ticker) DO UPDATE SET status = excluded.status, rows = excluded.rows,
+            error = excluded.error, updated_at = excluded.updated_at""",
+            (dataset, ticker, status, rows, error, pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        self.db.conn.commit()
+
+    def store_(self, dataset, ticker, data):
+        # error strings are checkpointed and retried on the next run; other
+        # strings (get_dividend's "no div") mean the ticker has nothing to add
+        spec = self.datasets[dataset]
+        if isinstance(data, str):
+            if data.startswith('ERROR!'):
+                self.checkpoint_(dataset, ticker, 'error', error=data)
+                return 0
+            data = pd.DataFrame()
+        if not data.empty:
+            self.db.upsert(data, spec['table'], key=spec['key'])
+        if dataset == 'options_aggs':
+            # same marks sync_aggs_options keeps; expired contracts that are
+            # fully stored are never requested again
+            last, expiration, _ = self.windows_.get(ticker, (None, None, False))
+            if not data.empty:
+                last = data['date'].max()
+            expired = expiration is not None and expiration < pd.Timestamp.today().normalize()
+            self.db.set_watermark(self.watermark_table, ticker, last, expired)
+        self.checkpoint_(dataset, ticker, 'done', len(data))
+        return len(data)
+
+    def option_windows_(self):
+        # contract -> (last stored date, expiration, complete) from the
+        # watermarks, the stored bars and the stored contract lists
+        marks = self.db.get_watermarks(self.watermark_table)
+        stored = self.db.get_last_dates('options_aggs', key_col='contract_ticker')
+        contracts = self.db.data_query("SELECT contract_ticker, expiration_date FROM options_contracts")
+        windows = {}
+        for contract, expiration in zip(contracts['contract_ticker'], pd.to_datetime(contracts['expiration_date'])):
+            last, complete = marks.get(contract, (None, False))
+            last = None if last is None else pd.Timestamp(last)
+            if stored.get(contract) is not None and (last is None or pd.Timestamp(stored[contract]) > last):
+                last = pd.Timestamp(stored[contract])
+            windows[contract] = (last, expiration, complete)
+        return windows
+
+    ##############################
+
+    def done_(self, dataset):
+        # incremental datasets pick up new bars every day, so their done
+        # marks only count for the day they were written; the rest stay done
+        # until reset
+        df = self.checkpoints(dataset)
+        df = df[df['status'] == 'done']
+        if dataset in self.incremental:
+            df = df[df['updated_at'].astype(str).str[:10] == pd.Timestamp.today().strftime('%Y-%m-%d')]
+        return set(df['ticker'])
+
+    def checkpoints(self, dataset=None):
+        if dataset is None:
+            return self.db.data_query(f"SELECT * FROM {self.checkpoint_table}")
+        return self.db.data_query(f"SELECT * FROM {self.checkpoint_table} WHERE dataset = ?", [dataset])
+
+    def status(self):
+        df = self.checkpoints()
+        if df.empty:
+            return df
+        return df.pivot_table(index='dataset', columns='status', values='ticker', aggfunc='count', fill_value=0)
+
+    def reset(self, datasets=None):
+        if datasets is None:
+            self.db.conn.execute(f"DELETE FROM {self.checkpoint_table}")
+        else:
+            marks = ', '.join('?' * len(datasets))
+            self.db.conn.execute(f"DELETE FROM {self.checkpoint_table} WHERE dataset IN ({marks})", list(datasets))
+        self.db.conn.commit()
+
+    def plan(self, scheduler, datasets=None, snp_source='list', priorities=None, verbose=True):
+        # adds one mapped task per dataset to a TaskScheduler. tickers are
+        # expanded when the dataset's dependencies finish, minus the ones
+        # already checkpointed as done. with snp_source='live' the S&P
+        # universe comes from get_snp_companies instead of Lists.py, and
+        # options_aggs always waits for the contract lists of this run
+        datasets = list(self.datasets) if datasets is None else list(datasets)
+        priorities = {**self.priorities, **(priorities or {})}
+        summary = {i: {'pending': 0, 'done': 0, 'errors': 0, 'rows': 0, 'skipped': 0} for i in datasets}
+        if snp_source == 'live' and any(self.datasets[i]['universe'] in ('snp', 'options_contracts') for i in datasets):
+            scheduler.add('snp_companies', self.clients['fmp'].get_snp_companies, provider='fmp',
+                          priority=priorities['snp_companies'], on_done=self.store_universe_)
+
+        def items_(dataset):
+            def expand_(results):
+                snp = results['snp_companies']['symbol'].tolist() if 'snp_companies' in results else None
+                tickers = self.universe_(dataset, snp)
+                if dataset == 'options_aggs':
+                    self.windows_ = self.option_windows_() if tickers else {}
+                done = self.done_(dataset)
+                pending = [i for i in tickers if i not in done]
+                summary[dataset]['skipped'] = len(tickers) - len(pending)
+                summary[dataset]['pending'] = len(pending)
+                return pending
+            return expand_
+
+        def on_done_(dataset):
+            def store_(ticker, data):
+                rows = self.store_(dataset, ticker, data)
+                if isinstance(data, str) and data.startswith('ERROR!'):
+                    summary[dataset]['errors'] += 1
+                    if verbose:
+                        print(f"{dataset} {ticker}: {data}")
+                else:
+                    summary[dataset]['done'] += 1
+                    summary[dataset]['rows'] += rows
+            return store_
+
+        for dataset in datasets:
+            spec = self.datasets[dataset]
+            deps = [i for i in spec.get('deps', []) if i in datasets]
+            if 'snp_companies' in scheduler.tasks and spec['universe'] in ('snp', 'options_contracts'):
+                deps.append('snp_companies')
+            scheduler.add_map(dataset, self.fetcher_(dataset), items_(dataset), provider=spec['provider'],
+                              deps=deps, priority=priorities.get(dataset, 0), on_done=on_done_(dataset), keep=False)
+        return summary
+
+    def store_universe_(self, data):
+        if not isinstance(data, str):
+            self.db.upsert(data, 'snp_companies', key=['symbol'])
+
+    def run(self, datasets=None, snp_source='list', priorities=None, verbose=True):
+        # providers run side by side in their own pools of `workers`
+        # threads (all drawing on the shared rate limiters); tickers already
+        # checkpointed as done are skipped, so an interrupted job resumes
+        # where it stopped
+        scheduler = TaskScheduler({i: self.workers for i in ['fmp', 'fred', 'polygon']})
+        summary = self.plan(scheduler, datasets, snp_source, priorities, verbose)
+        scheduler.run()
+        for name, error in scheduler.errors.items():
+            if verbose and '/' not in name:
+                print(f"{name}: {error}")
+        summary = pd.DataFrame(summary).T
+        if verbose:
+            print(summary.to_string())
+        return summary
+
+
+class TaskScheduler:
+    # worker threads per provider; 'local' is for anything that isn't a
+    # network call
+    default_pools = {'fmp': 8, 'fred': 4, 'polygon': 4, 'local': 1}
+
+    def __init__(self, pools=None):
+        # tasks are grouped by provider and each provider has its own pool,
+        # so a throttled provider only holds up its own queue. within a
+        # provider the highest priority ready task goes first, ties in the
+        # order they were added. on_done callbacks run on the thread that
+        # called run(), which is where sqlite writes belong
+        self.pools = {**self.default_pools, **(pools or {})}
+        self.tasks = {}
+        self.results = {}
+        self.errors = {}
+        self.counter = itertools.count()
+
+    def add(self, name, fn, args=(), kwargs=None, provider='local', deps=(), priority=0, on_done=None):
+        # fn(*args, **kwargs) runs once every task in deps has succeeded;
+        # on_done(result) gets the result, or the "ERROR! ..." string
+        if name in self.tasks:
+            raise ValueError(f"task '{name}' already added")
+        self.tasks[name] = {
+            'fn': fn, 'args': tuple(args), 'kwargs': kwargs or {}, 'provider': provider,
+            'deps': list(deps), 'priority': priority, 'on_done': on_done, 'items': None
+        }
+        return name
+
+    def add_map(self, name, fn, items, provider='local', deps=(), priority=0, on_done=None, keep=True):
+        # one fn(item) task per item; items is an iterable or a callable
+        # taking {dep: result} and returning one, evaluated when deps finish.
+        # on_done(item, result) runs per item and the task's own result is
+        # {item: result} for the items that succeeded; keep=False stores
+        # None instead, for results on_done has already written somewhere
+        self.add(name, fn, provider=provider, deps=deps, priority=priority, on_done=on_done)
+        self.tasks[name]['items'] = items
+        self.tasks[name]['keep'] = keep
+        return name
+
+    ##############################
+
+    def order_(self):
+        # Kahn's algorithm, only to reject unknown deps and cycles up front
+        for name, task in self.tasks.items():
+            missing = [i for i in task['deps'] if i not in self.tasks]
+            if missing:
+                raise ValueError(f"task '{name}' depends on unknown task(s): {', '.join(missing)}")
+        indegree = {name: len(task['deps']) for name, task in self.tasks.items()}
+        ready = [name for name, n in indegree.items() if n == 0]
+        seen = 0
+        while ready:
+            name = ready.pop()
+            seen += 1
+            for other, task in self.tasks.items():
+                if name in task['deps']:
+                    indegree[other] -= 1
+                    if indegree[other] == 0:
+                        ready.append(other)
+        if seen != len(self.tasks):
+            raise ValueError("task graph has a cycle")
+
+    def failed_(self, result):
+        return isinstance(result, str) and result.startswith('ERROR!')
+
+    def run(self):
+        self.order_()
+        dependents = {name: [] for name in self.tasks}
+        waiting = {}
+        for name, task in self.tasks.items():
+            waiting[name] = set(task['deps'])
+            for dep in task['deps']:
+                dependents[dep].append(name)
+        queues = {i: [] for i in self.pools}
+        pools = {}
+        running = {}
+        active = {i: 0 for i in self.pools}
+        maps = {}
+
+        def push_(provider, priority, key, fn, args, kwargs):
+            if provider not in self.pools:
+                raise ValueError(f"no pool for provider '{provider}'")
+            heapq.heappush(queues[provider], (-priority, next(self.counter), key, fn, args, kwargs))
+
+        def finish_(name, result):
+            task = self.tasks[name]
+            if self.failed_(result):
+                self.errors[name] = result
+            else:
+                self.results[name] = result
+            if task['items'] is None and task['on_done'] is not None:
+                task['on_done'](result)
+            for other in dependents[name]:
+                waiting[other].discard(name)
+                if name in self.errors:
+                    if other not in self.errors and other not in self.results:
+                        finish_(other, f"ERROR! skipped; dependency '{name}' failed")
+                elif not waiting[other] and other not in self.errors:
+                    start_(other)
+
+        def start_(name):
+            task = self.tasks[name]
+            if task['items'] is None:
+                push_(task['provider'], task['priority'], (name, None), task['fn'], task['args'], task['kwargs'])
+                return
+            items = task['items']
+            if callable(items):
+                try:
+                    items = items({i: self.results[i] for i in task['deps']})
+                except Exception as e:
+                    finish_(name, f"ERROR! {type(e).__name__}: {e}")
+                    return
+            items = list(items)
+            maps[name] = {'left': len(items), 'results': {}}
+            if not items:
+                del maps[name]
+                finish_(name, {})
+                return
+            for item in items:
+                push_(task['provider'], task['priority'], (name, item), task['fn'], (item,), {})
+
+        def submit_():
+            for provider, queue in queues.items():
+                while queue and active[provider] < self.pools[provider]:
+                    _, _, key, fn, args, kwargs = heapq.heappop(queue)
+                    if provider not in pools:
+                        pools[provider] = ThreadPoolExecutor(max_workers=self.pools[provider])
+                    running[pools[provider].submit(fn, *args, **kwargs)] = (provider, key)
+                    active[provider] += 1
+
+        try:
+            for name in self.tasks:
+                if not waiting[name]:
+                    start_(name)
+            submit_()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    provider, (name, item) = running.pop(future)
+                    active[provider] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = f"ERROR! {type(e).__name__}: {e}"
+                    if name not in maps:
+                        finish_(name, result)
+                        continue
+                    on_done = self.tasks[name]['on_done']
+                    if on_done is not None:
+                        on_done(item, result)
+                    if self.failed_(result):
+                        self.errors[f'{name}/{item}'] = result
+                    else:
+                        maps[name]['results'][item] = result if self.tasks[name]['keep'] else None
+                    maps[name]['left'] -= 1
+                    if maps[name]['left'] == 0:
+                        finish_(name, maps.pop(name)['results'])
+                submit_()
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+        return self.results
+
+
+# worker side of CleaningPipeline; each process builds one session-less
+# FmpClient.Utils and runs the cleaners on it
+cleaners_ = {}
+
+
+def clean_payload_(cleaner, data):
+    if 'utils' not in cleaners_:
+        cleaners_['utils'] = FmpClient.Utils()
+    return getattr(cleaners_['utils'], cleaner)(data)
+
+
+class CleaningPipeline:
+    def __init__(self, fmp, fetch_workers=8, clean_workers=None, max_pending=32):
+        # payloads are fetched on fetch_workers threads and cleaned in a
+        # process pool, so the GIL-bound pandas work overlaps the network
+        # instead of sharing its threads. at most max_pending raw payloads
+        # wait in the queue and max_pending cleans are in flight; past that
+        # the fetch threads block, which holds back further requests
+        self.fmp = fmp
+        self.fetch_workers = fetch_workers
+        self.clean_workers = clean_workers
+        self.max_pending = max_pending
+
+    def iter(self, endpoint, tickers):
+        # endpoint is one of FmpClient.statements, e.g. 'get_income_statement_q';
+        # yields (ticker, frame or "ERROR! ..." string) as cleans finish
+        cleaner = self.fmp.statements[endpoint][1]
+        symbols = [i['symbol'] if isinstance(i, dict) else i for i in tickers]
+        raw = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()
+
+        def fetch_(symbol):
+            try:
+                data = self.fmp.get_raw(endpoint, symbol)
+            except Exception as e:
+                data = f"ERROR! {type(e).__name__}: {e}"
+            while not stop.is_set():
+                try:
+                    raw.put((symbol, data), timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def feed_(fetchers):
+            wait(fetchers)
+            while not stop.is_set():
+                try:
+                    raw.put(None, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        clean_pool = ProcessPoolExecutor(max_workers=self.clean_workers)
+        feeder = threading.Thread(target=feed_, args=([fetch_pool.submit(fetch_, i) for i in symbols],), daemon=True)
+        feeder.start()
+        running = {}
+        try:
+            fed = True
+            while fed or running:
+                # take payloads while there is room in the process pool, then
+                # hand back whatever cleans have finished
+                while fed and len(running) < self.max_pending:
+                    try:
+                        item = raw.get(timeout=0.05 if running else None)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        fed = False
+                        break
+                    symbol, data = item
+                    if isinstance(data, str):
+                        yield symbol, data
+                    else:
+                        running[clean_pool.submit(clean_payload_, cleaner, data)] = symbol
+                if not running:
+                    continue
+                timeout = None if not fed or len(running) >= self.max_pending else 0
+                finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    symbol = running.pop(future)
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        df = f"ERROR! {type(e).__name__}: {e}"
+                    yield symbol, df
+        finally:
+            stop.set()
+            fetch_pool.shutdown(wait=True, cancel_futures=True)
+            clean_pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, endpoint, tickers, sink=None, table_name=None):
+        # sink is a DataBaseClient (rows are upserted on the dataset key into
+        # table_name, default the statement table, e.g. income_q) or any
+        # callable taking (ticker, frame); with no sink the frames are
+        # returned. writes run on the calling thread
+        results = {}
+        errors = {}
+        if isinstance(sink, DataBaseClient):
+            spec = next(v for v in IngestionJob.datasets.values() if v['method'] == endpoint)
+            table_name = table_name or spec['table']
+            write = lambda symbol, df: sink.upsert(df, table_name, key=spec['key'])
+        else:
+            write = sink
+        for symbol, df in self.iter(endpoint, tickers):
+            if isinstance(df, str):
+                errors[symbol] = df
+            elif write is None:
+                results[symbol] = df
+            else:
+                write(symbol, df)
+                results[symbol] = len(df)
+        return results, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest Lists.py universes into the finpy database.')
+    parser.add_argument('datasets', nargs='*', metavar='dataset', help=f"datasets to ingest (default all): {', '.join(IngestionJob.datasets)}")
+    parser.add_argument('--db', default='econ_data.db', help='sqlite database path')
+    parser.add_argument('--cache', default=None, help='ResponseCache path; no response cache if omitted')
+    parser.add_argument('--workers', type=int, default=4, help='fetch threads per provider')
+    parser.add_argument('--live-universe', action='store_true', help='take the S&P universe from get_snp_companies instead of Lists.py')
+    parser.add_argument('--limit', type=int, default=None, help='only the first N tickers of each universe')
+    parser.add_argument('--reset', action='store_true', help='clear the checkpoints of the selected datasets first')
+    parser.add_argument('--status', action='store_true', help='print checkpoint counts and exit')
+    args = parser.parse_args(argv)
+    unknown = [i for i in args.datasets if i not in IngestionJob.datasets]
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(unknown)}")
+
+    db = DataBaseClient(args.db)
+    datasets = args.datasets or list(IngestionJob.datasets)
+    providers = {IngestionJob.datasets[i]['provider'] for i in datasets}
+    if args.status:
+        print(IngestionJob(db).status().to_string())
+        db.close_db()
+        return
+    from Keys import FMPKey, PolygonKey, FREDKey
+    cache = ResponseCache(args.cache) if args.cache else None
+    job = IngestionJob(
+        db,
+        fmp=FmpClient(FMPKey, cache=cache) if 'fmp' in providers else None,
+        fred=FredClient(FREDKey, cache=cache) if 'fred' in providers else None,
+        options=OptionsClient(PolygonKey, cache=cache) if 'polygon' in providers else None,
+        workers=args.workers,
+        limit=args.limit
+    )
+    try:
+        if args.reset:
+            job.reset(datasets)
+        job.run(datasets, snp_source='live' if args.live_universe else 'list')
+    finally:
+        if job.clients['fmp'] is not None:
+            job.clients['fmp'].close()
+        if cache is not None:
+            cache.close()
+        db.close_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,285 @@
 
+import numpy as np
 import pandas as pd
 from polygon import RESTClient
 import sqlite3
 from fredapi import Fred
 import requests
+import asyncio
+import os
+import pickle
+import random
+import re
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    # only ParquetClient needs pyarrow
+    pa = None
+
+try:
+    import duckdb
+except ImportError:
+    # only AnalyticsClient needs duckdb
+    duckdb = None
+
+
+class RateLimiter:
+    def __init__(self, rate, per=60, burst=None, max_retries=5, backoff_base=1.0,
+                 backoff_max=60.0, retry_ratio=0.1, min_retry_budget=10):
+        # token bucket refilled at rate/per tokens a second; retries draw on a
+        # separate budget that earns retry_ratio per request so a struggling
+        # provider can't turn one bulk pull into a retry storm
+        self.rate = rate / per
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_ratio = retry_ratio
+        self.retry_cap = min_retry_budget + self.capacity * retry_ratio
+        self.retry_budget = min_retry_budget
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        self.retry_budget = min(self.retry_cap, self.retry_budget + self.retry_ratio * tokens)
+                        return
+                    wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, attempt, retry_after=None):
+        # called after a 429/5xx; returns False once the retry allowance is
+        # spent, otherwise pauses every caller sharing this bucket
+        with self.lock:
+            if attempt >= self.max_retries or self.retry_budget < 1:
+                return False
+            self.retry_budget -= 1
+            delay = self.retry_after_(retry_after)
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            self.tokens = 0
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            wait = self.paused_until - time.monotonic()
+        time.sleep(max(wait, 0))
+        return True
+
+    def call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self.throttled_(e) or not self.throttle(attempt):
+                    raise
+                attempt += 1
+
+    def retry_after_(self, retry_after):
+        if retry_after is None:
+            return None
+        try:
+            return min(float(retry_after), self.backoff_max)
+        except ValueError:
+            pass
+        try:
+            delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            return min(max(delay, 0), self.backoff_max)
+        except (TypeError, ValueError):
+            return None
+
+    def throttled_(self, error):
+        message = str(error).lower()
+        return any(i in message for i in [
+            '429',
+            'too many requests',
+            'rate limit',
+            'exceeded the maximum requests',
+            'error responses'
+        ])
+
+
+rate_limits = {
+    'fmp': RateLimiter(300),
+    'polygon': RateLimiter(5),
+    'fred': RateLimiter(120)
+}
+
+
+class ResponseCache:
+    # ttl in seconds by endpoint fragment; the longest fragment found in the
+    # key wins, so 'historical-price-full/stock_dividend' beats the aggs entry
+    default_ttls = {
+        'quote-short': 60,
+        'market-capitalization': 300,
+        'historical-market-capitalization': 86400,
+        'historical-price-full': 43200,
+        'historical-price-full/stock_dividend': 86400,
+        'income-statement': 604800,
+        'balance-sheet-statement': 604800,
+        'cash-flow-statement': 604800,
+        '_constituent': 86400,
+        'fred://series': 43200,
+        'polygon://contracts': 86400,
+        'polygon://aggs': 43200
+    }
+
+    def __init__(self, path='finpy_cache.db', max_bytes=512 * 1024 ** 2, ttls=None, default_ttl=86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = {**self.default_ttls, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                expires REAL,
+                accessed REAL,
+                size INTEGER,
+                payload BLOB
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def key_(self, url):
+        # api keys never reach the disk and parameter order doesn't matter
+        parts = urlsplit(url)
+        query = sorted(
+            (k, v) for k, v in parse_qsl(parts.query)
+            if k.lower() not in ('apikey', 'api_key')
+        )
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+    def ttl_(self, key):
+        matches = [i for i in self.ttls if i in key]
+        if not matches:
+            return self.default_ttl
+        return self.ttls[max(matches, key=len)]
+
+    def get(self, url):
+        key = self.key_(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT expires, size, payload FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] < now:
+                if row is not None:
+                    self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self.conn.commit()
+                    self.size -= row[1]
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return pickle.loads(zlib.decompress(row[2]))
+
+    def set(self, url, data):
+        key = self.key_(url)
+        payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (key, now + self.ttl_(key), now, len(payload), payload)
+            )
+            self.size += len(payload) - (old[0] if old else 0)
+            self.evict_()
+            self.conn.commit()
+
+    def evict_(self):
+        # least recently read entries go first until back under the bound
+        while self.size > self.max_bytes:
+            row = self.conn.execute("SELECT key, size FROM cache ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.conn.execute("DELETE FROM cache WHERE key = ?", (row[0],))
+            self.size -= row[1]
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': self.size
+        }
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM cache")
+            self.conn.commit()
+            self.size = 0
+
+    def close(self):
+        self.conn.close()
 
 
 class OptionsClient:
-    def __init__(self, api_key):
-        self.client = RESTClient(api_key=api_key)
-        self.utils = self.Utils()
+    def __init__(self, api_key, rate_limiter=None, cache=None):
+        # retries are left to the shared limiter instead of urllib3
+        self.client = RESTClient(api_key=api_key, retries=0)
+        self.limiter = rate_limiter or rate_limits['polygon']
+        self.utils = self.Utils(self.limiter, cache)
 
     class Utils:
-        def __init__(self):
-            pass
+        def __init__(self, limiter=None, cache=None):
+            self.limiter = limiter
+            self.cache = cache
+
+        def collect_(self, fetch, limit, key=None):
+            if self.cache is not None and key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+                items = self.collect_(fetch, limit)
+                if items:
+                    self.cache.set(key, items)
+                return items
+
+            # polygon pages behind the iterator, so take a token per page
+            def pages_():
+                items = []
+                for item in fetch():
+                    items.append(item)
+                    if self.limiter is not None and len(items) % limit == 0:
+                        self.limiter.acquire()
+                return items
+
+            if self.limiter is None:
+                return pages_()
+            return self.limiter.call(pages_)
 
         def options_contract_data_clean_(self, data, ticker):
             df = pd.DataFrame(data)
@@ -45,9 +311,10 @@ class OptionsClient:
     ##############################
 
     def get_contracts_from_ticker(self, ticker):
-        contracts = []
-        for contract in self.client.list_options_contracts(ticker.upper(), limit=1000):
-            contracts.append(contract)
+        contracts = self.utils.collect_(
+            lambda: self.client.list_options_contracts(ticker.upper(), limit=1000), 1000,
+            f'polygon://contracts/{ticker.upper()}'
+        )
         df = self.utils.options_contract_data_clean_(contracts, ticker)
         if not contracts:
             return "ERROR! dictionary empty; check request parameters"
@@ -55,10 +322,11 @@ class OptionsClient:
             df['ticker'] = ticker.upper()
             return df
         
-    def get_aggs_options(self, contract_ticker):
-        contract_pricing = []
-        for agg in self.client.list_aggs(contract_ticker, 1, 'day', '2000-01-01', '2025-01-01', limit=5000):
-            contract_pricing.append(agg)
+    def get_aggs_options(self, contract_ticker, start='2000-01-01', finish='2025-01-01'):
+        contract_pricing = self.utils.collect_(
+            lambda: self.client.list_aggs(contract_ticker, 1, 'day', start, finish, limit=5000), 5000,
+            f'polygon://aggs/{contract_ticker}?from={start}&to={finish}'
+        )
         if not contract_pricing:
             return "ERROR! dictionary empty; check request parameters"
         else:
@@ -66,29 +334,428 @@ class OptionsClient:
             df['contract_ticker'] = contract_ticker
             return df
 
+    def sync_aggs_options(self, db, contracts, table_name='options_aggs', watermark_table='options_sync'):
+        # contracts is a frame from get_contracts_from_ticker or an underlying
+        # ticker; each contract keeps a high-water mark so reruns only page
+        # through bars after it, and expired contracts that are fully stored
+        # are never requested again. a contract whose fetch raises is listed
+        # in summary['errors'] and keeps its watermark for the next run
+        if isinstance(contracts, str):
+            contracts = self.get_contracts_from_ticker(contracts)
+            if isinstance(contracts, str):
+                return contracts
+        marks = db.get_watermarks(watermark_table)
+        stored = db.get_last_dates(table_name, key_col='contract_ticker')
+        today = pd.Timestamp.today().normalize()
+        summary = {'fetched': 0, 'skipped': 0, 'rows': 0, 'errors': {}}
+        for contract, expiration in zip(contracts['contract_ticker'], pd.to_datetime(contracts['expiration_date'])):
+            last, complete = marks.get(contract, (None, False))
+            if complete:
+                summary['skipped'] += 1
+                continue
+            if stored.get(contract) is not None and (last is None or stored[contract] > last):
+                last = stored[contract]
+            finish = min(today, expiration)
+            start = pd.Timestamp('2000-01-01') if last is None else last + pd.Timedelta(days=1)
+            if start <= finish:
+                try:
+                    df = self.get_aggs_options(contract, start.strftime('%Y-%m-%d'), finish.strftime('%Y-%m-%d'))
+                except Exception as e:
+                    summary['errors'][contract] = f"ERROR! {type(e).__name__}: {e}"
+                    continue
+                summary['fetched'] += 1
+                if not isinstance(df, str):
+                    if last is not None:
+                        df = df[df['date'] > last]
+                    if not df.empty:
+                        db.data_add(df, table_name)
+                        last = df['date'].max()
+                        summary['rows'] += len(df)
+            else:
+                summary['skipped'] += 1
+            db.set_watermark(watermark_table, contract, last, expiration < today)
+        return summary
+
+    def get_chain_aggs(self, ticker, expiry_range=None, workers=8, sink=None, table_name='options_aggs'):
+        # sink is a DataBaseClient or ParquetClient, a parquet directory or
+        # any callable taking a frame; frames are handed off as they land and
+        # then dropped, and at most 2 * workers fetches are in flight, so
+        # memory doesn't grow with the size of the chain. with no sink the
+        # frames are concatenated
+        contracts = self.get_contracts_from_ticker(ticker)
+        if isinstance(contracts, str):
+            return contracts
+        if expiry_range is not None:
+            start, finish = expiry_range
+            if start is not None:
+                contracts = contracts[contracts['expiration_date'] >= pd.Timestamp(start)]
+            if finish is not None:
+                contracts = contracts[contracts['expiration_date'] <= pd.Timestamp(finish)]
+        frames = []
+        if sink is None:
+            write = frames.append
+        elif hasattr(sink, 'data_add'):
+            write = lambda df: sink.data_add(df, table_name)
+        elif isinstance(sink, str):
+            os.makedirs(sink, exist_ok=True)
+            write = lambda df: df.to_parquet(
+                os.path.join(sink, f"{df['contract_ticker'].iloc[0].replace(':', '_')}.parquet"),
+                index=False
+            )
+        else:
+            write = sink
+        summary = {'contracts': len(contracts), 'rows': 0, 'errors': {}}
+        pending = iter(contracts['contract_ticker'])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while True:
+                for contract in pending:
+                    running[pool.submit(self.get_aggs_options, contract)] = contract
+                    if len(running) >= 2 * workers:
+                        break
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    contract = running.pop(future)
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        df = f"ERROR! {type(e).__name__}: {e}"
+                    if isinstance(df, str):
+                        summary['errors'][contract] = df
+                    else:
+                        write(df)
+                        summary['rows'] += len(df)
+        if sink is None:
+            return pd.concat(frames, ignore_index=True) if frames else "ERROR! dictionary empty; check request parameters"
+        return summary
+
 
 class DataBaseClient:
-    def __init__(self, db_name):
+    # (key, date) pairs that get a composite index wherever both columns exist
+    index_keys = [
+        ['ticker', 'date'],
+        ['symbol', 'date'],
+        ['contract_ticker', 'date']
+    ]
+
+    def __init__(self, db_name, auto_index=True, date_storage='iso', cached_statements=256):
+        # date_storage 'iso' keeps the text dates to_sql has always written;
+        # 'epoch' stores date columns of tables this client creates as
+        # integer days since 1970-01-01 (declared EPOCHDAY INTEGER), which
+        # read back with a plain cast instead of a string parse. existing
+        # tables keep whatever encoding their schema declares.
+        # sqlite keeps the last cached_statements queries prepared, so reusing
+        # one parameterized sql string skips re-parsing the statement
         self.db = db_name
-        self.conn = sqlite3.connect(db_name)
+        self.conn = sqlite3.connect(db_name, cached_statements=cached_statements)
+        self.auto_index = auto_index
+        self.date_storage = date_storage
+        self.utils = self.Utils()
+        if auto_index:
+            try:
+                self.ensure_indexes()
+            except sqlite3.OperationalError:
+                # read-only file; query it as it is
+                pass
 
-    def data_query(self, sql_string):
-        df = pd.read_sql(sql_string, self.conn)
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            return df
-        elif 'expiration_date' in df.columns:
-            df['expiration_date'] = pd.to_datetime(df['expiration_date'])
-            return df
-        else:
+    class Utils:
+        date_columns = ['date', 'expiration_date', 'filing_date', 'last_date']
+
+        def __init__(self):
+            pass
+
+        def rows_(self, df, epoch=()):
+            # column-wise conversion to plain python values; dates in the
+            # epoch columns become day numbers, the rest are written in the
+            # same text format to_sql uses, formatting each distinct date
+            # once. sqlite binds float NaN as NULL so numpy columns go
+            # through untouched
+            columns = []
+            for col in df.columns:
+                values = df[col]
+                if pd.api.types.is_datetime64_any_dtype(values):
+                    columns.append(self.encode_dates_(values, col in epoch).tolist())
+                elif isinstance(values.dtype, np.dtype):
+                    columns.append(values.to_numpy().tolist())
+                else:
+                    columns.append(values.to_numpy(dtype=object, na_value=None).tolist())
+            return list(zip(*columns))
+
+        def encode_dates_(self, values, epoch=False):
+            if epoch:
+                days = values.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+                return np.where(values.isna().to_numpy(), None, days.astype(object))
+            codes, uniques = pd.factorize(values)
+            text = np.append(uniques.strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object), None)
+            return text[codes]
+
+        def is_date_(self, value):
+            return isinstance(value, (pd.Timestamp, np.datetime64)) or hasattr(value, 'isoformat')
+
+        def encode_params_(self, params, epoch=False):
+            # timestamps in query parameters compare against the stored form
+            if params is None:
+                return ()
+            def encode_(value):
+                if self.is_date_(value):
+                    value = pd.Timestamp(value)
+                    if epoch:
+                        return int(value.normalize().value // 86400000000000)
+                    return value.strftime('%Y-%m-%d %H:%M:%S')
+                return value
+            if isinstance(params, dict):
+                return {k: encode_(v) for k, v in params.items()}
+            return [encode_(i) for i in params]
+
+        def date_column_(self, col):
+            # the fundamentals panel keeps one filing_date_<table> per table
+            return col in self.date_columns or col.startswith('filing_date_')
+
+        def parse_dates_(self, df):
+            # epoch-day integers are cast, text goes through the iso fast path;
+            # every date column in the result is typed, not just the first
+            for col in [i for i in df.columns if self.date_column_(i)]:
+                values = df[col]
+                if pd.api.types.is_datetime64_any_dtype(values):
+                    continue
+                if pd.api.types.is_integer_dtype(values):
+                    df[col] = values.to_numpy().astype('datetime64[D]').astype('datetime64[ns]')
+                elif pd.api.types.is_float_dtype(values):
+                    df[col] = pd.to_datetime(values, unit='D')
+                else:
+                    df[col] = pd.to_datetime(values, format='ISO8601')
             return df
+
+        def frame_(self, cursor, rows):
+            df = pd.DataFrame.from_records(rows, columns=[i[0] for i in cursor.description])
+            return self.parse_dates_(df)
+
+    ##############################
+
+    def data_query(self, sql_string, params=None, explain=False):
+        # pass values as params ('... where ticker = ?', ['V']) rather than
+        # formatting them into the sql, so the prepared statement is reused
+        if explain:
+            print(self.explain(sql_string, params).to_string(index=False))
+        cursor = self.conn.execute(sql_string, self.params_(sql_string, params))
+        try:
+            return self.utils.frame_(cursor, cursor.fetchall())
+        finally:
+            cursor.close()
         
+    def data_query_iter(self, sql_string, chunksize=50000, params=None):
+        # sqlite steps the cursor lazily, so only one chunk of rows is in
+        # memory at a time; it has its own cursor so writes can interleave
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql_string, self.params_(sql_string, params))
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield self.utils.frame_(cursor, rows)
+        finally:
+            cursor.close()
+
     def data_add(self, df, table_name):
-        df.to_sql(table_name, self.conn, if_exists='append', index=False)
+        # appending to an existing table follows its declared date columns,
+        # so an iso table never gets integer days mixed into its text dates
+        dtype = None
+        dates = [i for i in df.columns if pd.api.types.is_datetime64_any_dtype(df[i])]
+        if self.table_exists_(table_name):
+            dates = [i for i in dates if i in self.epoch_columns_(table_name)]
+        elif self.date_storage != 'epoch':
+            dates = []
+        if dates:
+            df = df.assign(**{i: pd.array(self.utils.encode_dates_(df[i], True), dtype='Int64') for i in dates})
+            dtype = {i: 'EPOCHDAY INTEGER' for i in dates}
+        df.to_sql(table_name, self.conn, if_exists='append', index=False, dtype=dtype)
+        if self.auto_index:
+            self.ensure_indexes(table_name)
+
+    def data_add_bulk(self, df, table_name, batch_size=50000, fast=False, verbose=True):
+        # executemany batches inside a single transaction. fast switches to
+        # WAL and synchronous=OFF for the load only and restores both after;
+        # it skips the fsyncs (the load, not older data, can be lost if the
+        # machine dies mid-write) but a single-transaction load has few to
+        # skip, so measure before relying on it being quicker
+        start = time.perf_counter()
+        self.create_table_(df, table_name)
+        columns = ', '.join(f'"{i}"' for i in df.columns)
+        marks = ', '.join('?' * len(df.columns))
+        sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({marks})'
+        if fast:
+            synchronous = self.conn.execute("PRAGMA synchronous").fetchone()[0]
+            journal_mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=OFF")
+        try:
+            self.insert_(sql, df, table_name, batch_size)
+        finally:
+            if fast:
+                # journal_mode is persistent in the file; leaving WAL on would
+                # keep -wal/-shm files next to the database
+                self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+                self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        if self.auto_index:
+            self.ensure_indexes(table_name)
+        seconds = time.perf_counter() - start
+        stats = {
+            'rows': len(df),
+            'seconds': seconds,
+            'rows_per_sec': len(df) / seconds if seconds else float('inf')
+        }
+        if verbose:
+            print(f"{table_name}: {stats['rows']:,} rows in {seconds:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+        return stats
+
+    def upsert(self, df, table_name, key=('ticker', 'date'), batch_size=50000):
+        # rows whose key already exists are updated in place, so rerunning an
+        # ingestion cell costs the new rows only and never duplicates history
+        key = list(key)
+        df = df.drop_duplicates(subset=key, keep='last')
+        self.create_table_(df, table_name)
+        self.unique_index_(table_name, key)
+        columns = ', '.join(f'"{i}"' for i in df.columns)
+        marks = ', '.join('?' * len(df.columns))
+        keys = ', '.join(f'"{i}"' for i in key)
+        updates = ', '.join(f'"{i}" = excluded."{i}"' for i in df.columns if i not in key)
+        sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({marks}) ON CONFLICT ({keys}) '
+        sql += f'DO UPDATE SET {updates}' if updates else 'DO NOTHING'
+        self.insert_(sql, df, table_name, batch_size)
+        if self.auto_index:
+            self.ensure_indexes(table_name)
+        return len(df)
+
+    def create_table_(self, df, table_name):
+        dtype = {
+            i: 'EPOCHDAY INTEGER' if self.date_storage == 'epoch' else 'TIMESTAMP'
+            for i in df.columns if pd.api.types.is_datetime64_any_dtype(df[i])
+        }
+        schema = pd.io.sql.get_schema(df.head(0), table_name, con=self.conn, dtype=dtype)
+        self.conn.execute(schema.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+
+    def unique_index_(self, table_name, key):
+        keys = ', '.join(f'"{i}"' for i in key)
+        sql = f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table_name}_{"_".join(key)}" ON "{table_name}" ({keys})'
+        try:
+            self.conn.execute(sql)
+        except sqlite3.IntegrityError:
+            # history appended before the table had a key; keep the newest copy
+            with self.conn:
+                self.conn.execute(
+                    f'DELETE FROM "{table_name}" WHERE rowid NOT IN '
+                    f'(SELECT MAX(rowid) FROM "{table_name}" GROUP BY {keys})'
+                )
+            self.conn.execute(sql)
+
+    def insert_(self, sql, df, table_name, batch_size):
+        epoch = self.epoch_columns_(table_name)
+        with self.conn:
+            for i in range(0, len(df), batch_size):
+                self.conn.executemany(sql, self.utils.rows_(df.iloc[i:i + batch_size], epoch))
+
+    def table_exists_(self, table_name):
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.conn.execute(sql, (table_name,)).fetchone() is not None
+
+    def epoch_columns_(self, table_name):
+        # date encoding is a property of the table, read off its declared
+        # column types; date_storage only decides it for new tables
+        return {i[1] for i in self.conn.execute(f'PRAGMA table_info("{table_name}")') if 'EPOCHDAY' in i[2].upper()}
+
+    def date_storage_(self, table_name):
+        columns = [(i[1], i[2].upper()) for i in self.conn.execute(f'PRAGMA table_info("{table_name}")')]
+        if any('EPOCHDAY' in kind for _, kind in columns):
+            return 'epoch'
+        if any(self.utils.date_column_(name) or 'TIMESTAMP' in kind for name, kind in columns):
+            return 'iso'
+        return None
+
+    def params_(self, sql_string, params):
+        # timestamp parameters take the encoding of the tables the query
+        # reads; an epoch int compared with iso text matches every row
+        values = params.values() if isinstance(params, dict) else (params or [])
+        if not any(self.utils.is_date_(i) for i in values):
+            return self.utils.encode_params_(params)
+        tables = re.findall(r'\b(?:FROM|JOIN)\s+"?(\w+)"?', sql_string, flags=re.IGNORECASE)
+        storage = {self.date_storage_(i) for i in tables} - {None}
+        if len(storage) > 1:
+            raise ValueError(f"tables {', '.join(tables)} mix epoch and iso dates; pass date parameters already encoded")
+        storage = storage.pop() if storage else self.date_storage
+        return self.utils.encode_params_(params, storage == 'epoch')
 
     def get_table_names(self):
         df = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", self.conn)
         return df 
+
+    def ensure_indexes(self, table_name=None):
+        # per-ticker lookups become index seeks instead of full scans; an
+        # existing index already leading with the same columns (e.g. the
+        # upsert key) is reused rather than duplicated
+        if table_name is None:
+            tables = self.get_table_names()['name'].tolist()
+        else:
+            tables = [table_name]
+        created = []
+        for table in tables:
+            columns = [i[1] for i in self.conn.execute(f'PRAGMA table_info("{table}")')]
+            existing = [
+                [j[2] for j in self.conn.execute(f'PRAGMA index_info("{i[1]}")')]
+                for i in self.conn.execute(f'PRAGMA index_list("{table}")')
+            ]
+            for key in self.index_keys:
+                if not set(key) <= set(columns) or any(i[:len(key)] == key for i in existing):
+                    continue
+                name = f'ix_{table}_{"_".join(key)}'
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(key)})')
+                created.append(name)
+        if created:
+            self.conn.commit()
+        return created
+
+    def analyze(self):
+        # refreshes the planner statistics so it picks the composite indexes
+        self.conn.execute("ANALYZE")
+        self.conn.execute("PRAGMA optimize")
+        self.conn.commit()
+
+    def explain(self, sql_string, params=None):
+        cursor = self.conn.execute(f"EXPLAIN QUERY PLAN {sql_string}", self.params_(sql_string, params))
+        df = pd.DataFrame.from_records(cursor.fetchall(), columns=[i[0] for i in cursor.description])
+        return df[['id', 'parent', 'detail']]
+
+    def get_last_dates(self, table_name, key_col='ticker', date_col='date'):
+        tables = self.get_table_names()['name'].tolist()
+        if table_name not in tables:
+            return {}
+        df = self.data_query(f'SELECT {key_col}, MAX({date_col}) AS last_date FROM "{table_name}" GROUP BY {key_col}')
+        return dict(zip(df[key_col], df['last_date']))
+
+    def get_watermarks(self, table_name):
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                key TEXT PRIMARY KEY,
+                last_date TEXT,
+                complete INTEGER DEFAULT 0
+            )""")
+        df = self.data_query(f"SELECT key, last_date, complete FROM {table_name}")
+        return {
+            key: (None if pd.isna(last_date) else last_date, bool(complete))
+            for key, last_date, complete in zip(df['key'], df['last_date'], df['complete'])
+        }
+
+    def set_watermark(self, table_name, key, last_date, complete=False):
+        if last_date is not None:
+            last_date = pd.Timestamp(last_date).strftime('%Y-%m-%d %H:%M:%S')
+        self.conn.execute(
+            f"""INSERT INTO {table_name} (key, last_date, complete) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET last_date = excluded.last_date, complete = excluded.complete""",
+            (key, last_date, int(complete))
+        )
+        self.conn.commit()
     
     def close_db(self):
         self.conn.close()
@@ -96,10 +763,179 @@ class DataBaseClient:
     def delete_table(self, table_name):
         self.conn.execute(f"DROP TABLE {table_name}")
 
+    def analytics(self, parquet_root=None):
+        # commit first so the engine sees everything written on this connection
+        self.conn.commit()
+        return AnalyticsClient(self.db, parquet_root)
+
+
+class ParquetClient:
+    # same data_add / data_query / get_table_names surface as DataBaseClient,
+    # stored as root/table/<key>=<ticker>/year_=<yyyy>/part-*.parquet so reads
+    # only open the ticker and year directories they need and only decode
+    # the requested columns
+    partition_keys = ['ticker', 'symbol', 'contract_ticker']
+
+    def __init__(self, db_name):
+        if pa is None:
+            raise ImportError("ParquetClient needs pyarrow; pip install pyarrow")
+        self.db = db_name
+        os.makedirs(db_name, exist_ok=True)
+
+    def data_add(self, df, table_name):
+        key = next((i for i in self.partition_keys if i in df.columns), None)
+        partition_cols = []
+        if key is not None:
+            partition_cols.append(key)
+        if 'date' in df.columns:
+            df = df.assign(year_=pd.to_datetime(df['date']).dt.year)
+            partition_cols.append('year_')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            root_path=os.path.join(self.db, table_name),
+            partition_cols=partition_cols or None,
+            basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet'
+        )
+
+    def data_query(self, table_name, columns=None, filters=None, tickers=None, start=None, finish=None):
+        # filters are pyarrow/DNF tuples, e.g. [('close', '>', 100)]; tickers
+        # and start/finish also prune the partition directories
+        dataset = self.dataset_(table_name)
+        names = dataset.schema.names
+        key = next((i for i in self.partition_keys if i in names), None)
+        conditions = []
+        if filters is not None:
+            conditions.append(pq.filters_to_expression(filters))
+        if tickers is not None and key is not None:
+            tickers = [tickers] if isinstance(tickers, str) else tickers
+            conditions.append(ds.field(key).isin([i.upper() for i in tickers]))
+        if start is not None:
+            start = pd.Timestamp(start)
+            conditions.append(ds.field('date') >= pa.scalar(start, pa.timestamp('ns')))
+            if 'year_' in names:
+                conditions.append(ds.field('year_') >= start.year)
+        if finish is not None:
+            finish = pd.Timestamp(finish)
+            conditions.append(ds.field('date') <= pa.scalar(finish, pa.timestamp('ns')))
+            if 'year_' in names:
+                conditions.append(ds.field('year_') <= finish.year)
+        expression = None
+        for i in conditions:
+            expression = i if expression is None else expression & i
+        if columns is None:
+            columns = [i for i in names if i != 'year_']
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        return df
+
+    def dataset_(self, table_name):
+        path = os.path.join(self.db, table_name)
+        fields = []
+        for i in self.partition_keys:
+            if any(j.startswith(f'{i}=') for j in os.listdir(path)):
+                fields.append(pa.field(i, pa.string()))
+                break
+        fields.append(pa.field('year_', pa.int32()))
+        return ds.dataset(path, format='parquet', partitioning=ds.partitioning(pa.schema(fields), flavor='hive'))
+
+    def get_table_names(self):
+        names = sorted(i for i in os.listdir(self.db) if os.path.isdir(os.path.join(self.db, i)))
+        return pd.DataFrame({'name': names})
+
+    def close_db(self):
+        pass
+
+    def delete_table(self, table_name):
+        shutil.rmtree(os.path.join(self.db, table_name))
+
+
+class AnalyticsClient:
+    # in-process columnar sql over the sqlite file and/or the parquet tables;
+    # joins, window functions and ASOF joins run vectorized inside duckdb
+    # and only the finished frame is handed to pandas
+    def __init__(self, db_name=None, parquet_root=None):
+        if duckdb is None:
+            raise ImportError("AnalyticsClient needs duckdb; pip install duckdb")
+        self.db = db_name
+        self.parquet_root = parquet_root
+        self.conn = duckdb.connect()
+        if db_name is not None:
+            self.attach_sqlite_(db_name)
+        if parquet_root is not None:
+            self.attach_parquet_(parquet_root)
+
+    def attach_sqlite_(self, db_name):
+        self.conn.execute("INSTALL sqlite")
+        self.conn.execute("LOAD sqlite")
+        self.conn.execute(f"ATTACH '{db_name}' AS sqlite_db (TYPE SQLITE, READ_ONLY)")
+        columns = self.conn.execute("""
+            SELECT table_name, column_name, data_type FROM information_schema.columns
+            WHERE table_catalog = 'sqlite_db'
+        """).df()
+        for table, group in columns.groupby('table_name'):
+            casts = []
+            for name, kind in zip(group['column_name'], group['data_type']):
+                if not DataBaseClient.Utils().date_column_(name):
+                    continue
+                # EPOCHDAY INTEGER columns come through as integers, iso text as strings
+                if kind in ('BIGINT', 'INTEGER'):
+                    casts.append(f'CAST(DATE \'1970-01-01\' + CAST("{name}" AS INTEGER) AS TIMESTAMP) AS "{name}"')
+                else:
+                    casts.append(f'CAST("{name}" AS TIMESTAMP) AS "{name}"')
+            replace = f" REPLACE ({', '.join(casts)})" if casts else ''
+            self.conn.execute(f'CREATE OR REPLACE VIEW "{table}" AS SELECT *{replace} FROM sqlite_db."{table}"')
+
+    def attach_parquet_(self, parquet_root):
+        # parquet tables shadow sqlite tables with the same name
+        for table in os.listdir(parquet_root):
+            path = os.path.join(parquet_root, table)
+            if not os.path.isdir(path):
+                continue
+            # tables without a date column have no year_ partition to drop
+            partitioned = any(j.startswith('year_=') for _, dirs, _ in os.walk(path) for j in dirs)
+            exclude = ' EXCLUDE (year_)' if partitioned else ''
+            self.conn.execute(f"""
+                CREATE OR REPLACE VIEW "{table}" AS
+                SELECT *{exclude} FROM read_parquet('{path}/**/*.parquet', hive_partitioning = true, union_by_name = true)
+            """)
+
+    def data_query(self, sql_string, params=None):
+        return self.conn.execute(sql_string, params or []).df()
+
+    def get_table_names(self):
+        return self.conn.execute(
+            "SELECT table_name AS name FROM information_schema.tables WHERE table_catalog = current_database() ORDER BY 1"
+        ).df()
+
+    def asof_features(self, price_table, series, macro_table='all_data', tickers=None, lags=None):
+        # every price row gets the latest value of each macro series known on
+        # that day; lags (days per series) delay a value until it would have
+        # been published so the features can't see the future
+        lags = lags or {}
+        sql = f'SELECT p.*{"".join(f", m{i}.value AS {s.lower()}" for i, s in enumerate(series))} FROM {price_table} p'
+        params = []
+        for i, s in enumerate(series):
+            sql += f"""
+                ASOF LEFT JOIN (
+                    SELECT date + INTERVAL (CAST(? AS INTEGER)) DAY AS date, value
+                    FROM {macro_table} WHERE ticker = ?
+                ) m{i} ON p.date >= m{i}.date"""
+            params += [lags.get(s, 0), s]
+        if tickers is not None:
+            sql += f" WHERE p.ticker IN ({', '.join('?' * len(tickers))})"
+            params += [i.upper() for i in tickers]
+        sql += " ORDER BY p.ticker, p.date"
+        return self.data_query(sql, params)
+
+    def close_db(self):
+        self.conn.close()
+
 
 class FredClient:
-    def __init__(self, api_key):
+    def __init__(self, api_key, rate_limiter=None, cache=None):
         self.fred = Fred(api_key=api_key)
+        self.limiter = rate_limiter or rate_limits['fred']
+        self.cache = cache
         self.utils = self.Utils()
     
     class Utils:
@@ -117,31 +953,128 @@ class FredClient:
     ##############################
 
     def get_series(self, series):
-        data = self.fred.get_series(series)
+        key = f'fred://series/{series}'
+        data = self.cache.get(key) if self.cache is not None else None
+        if data is None:
+            data = self.limiter.call(self.fred.get_series, series)
+            if self.cache is not None:
+                self.cache.set(key, data)
         df = self.utils.fred_data_clean_(data)
         return df
+
+    def get_panel(self, tickers, freq=None, workers=8):
+        # tickers are fred ids or the dicts in Lists.fred_econ; the result is a
+        # single float64 block indexed by date with one column per series.
+        # with freq, each date of the freq grid takes the latest value
+        # observed on or before it, so nothing shows up ahead of its date
+        series = [i['ticker'] if isinstance(i, dict) else i for i in tickers]
+
+        def fetch_(ticker):
+            try:
+                return self.get_series(ticker)
+            except Exception as e:
+                return f"ERROR! {type(e).__name__}: {e}"
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = dict(zip(series, pool.map(fetch_, series)))
+        errors = {k: v for k, v in frames.items() if isinstance(v, str)}
+        frames = {k: v for k, v in frames.items() if not isinstance(v, str)}
+        if not frames:
+            return "ERROR! no series returned; check request parameters"
+        index = np.unique(np.concatenate([df['date'].to_numpy() for df in frames.values()]))
+        values = np.full((len(index), len(frames)), np.nan, dtype='float64')
+        for j, df in enumerate(frames.values()):
+            values[np.searchsorted(index, df['date'].to_numpy()), j] = df['value'].to_numpy(dtype='float64')
+        panel = pd.DataFrame(values, index=pd.DatetimeIndex(index, name='date'), columns=list(frames))
+        if freq is not None:
+            grid = pd.date_range(panel.index.min(), panel.index.max(), freq=freq, name='date')
+            panel = panel.reindex(panel.index.union(grid)).ffill().reindex(grid)
+        panel.attrs['errors'] = errors
+        return panel
     
 
 class FmpClient:
-    def __init__(self, api_key):
+    # single-ticker statement endpoints -> (url path, Utils cleaner); the
+    # get_* methods and get_raw build their urls from the same table
+    statements = {
+        'get_income_statement_a': ('income-statement/{ticker}?period=annual', 'income_statement_data_clean_'),
+        'get_income_statement_q': ('income-statement/{ticker}?period=quarter', 'income_statement_data_clean_'),
+        'get_balance_sheet_a': ('balance-sheet-statement/{ticker}?period=annual', 'balance_sheet_data_clean_'),
+        'get_balance_sheet_q': ('balance-sheet-statement/{ticker}?period=quarter', 'balance_sheet_data_clean_'),
+        'get_cash_flow_a': ('cash-flow-statement/{ticker}?period=annual', 'cash_flow_data_clean_'),
+        'get_cash_flow_q': ('cash-flow-statement/{ticker}?period=quarter', 'cash_flow_data_clean_')
+    }
+
+    def __init__(self, api_key, pool_size=10, pool_maxsize=10, pool_block=True, gzip=True,
+                 rate_limiter=None, cache=None):
         self.api_key = api_key
         self.base_url = 'https://financialmodelingprep.com/api/v3/'
-        self.utils = self.Utils()
+        self.session = self.session_(pool_size, pool_maxsize, pool_block, gzip)
+        self.limiter = rate_limiter or rate_limits['fmp']
+        self.utils = self.Utils(self.session, self.limiter, cache)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def session_(self, pool_size, pool_maxsize, pool_block, gzip):
+        # pool_size is the number of host pools kept alive, pool_maxsize the
+        # connections per host; pool_block makes extra threads wait for a
+        # free connection instead of opening throwaway ones
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        if gzip:
+            session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        else:
+            session.headers.update({'Accept-Encoding': 'identity'})
+        return session
+
+    def close(self):
+        self.session.close()
 
     class Utils:
-        def __init__(self):
-            pass
+        def __init__(self, session=None, limiter=None, cache=None):
+            self.session = session
+            self.limiter = limiter
+            self.cache = cache
         
         def request_(self, url):
-            r = requests.get(url)
+            if self.cache is not None:
+                cached = self.cache.get(url)
+                if cached is not None:
+                    return cached
+            attempt = 0
+            while True:
+                if self.limiter is not None:
+                    self.limiter.acquire()
+                if self.session is None:
+                    r = requests.get(url)
+                else:
+                    r = self.session.get(url)
+                if r.status_code != 429 and r.status_code < 500:
+                    break
+                if self.limiter is None or not self.limiter.throttle(attempt, r.headers.get('Retry-After')):
+                    return f"ERROR! status {r.status_code}; retries exhausted"
+                attempt += 1
             if r.status_code == 200:
                 data = r.json()
                 if not data:
                     return "ERROR! dictionary empty; check request parameters"
                 else:
+                    if self.cache is not None:
+                        self.cache.set(url, data)
                     return data
             else:
-                return r.json()
+                return f"ERROR! status {r.status_code}; {r.text}"
 
         def aggs_data_clean_(self, raw_data):
             data = raw_data['historical']
@@ -345,21 +1278,25 @@ class FmpClient:
         
     ##############################
 
-    def get_aggs(self, ticker):
-        url = f'{self.base_url}historical-price-full/{ticker.upper()}?from=2000-01-01&to=2025-01-01&apikey={self.api_key}'
+    def get_aggs(self, ticker, start='2000-01-01', finish='2025-01-01'):
+        url = f'{self.base_url}historical-price-full/{ticker.upper()}?from={start}&to={finish}&apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
+        elif not data.get('historical'):
+            return "ERROR! no bars in range; check request parameters"
         else:
             df = self.utils.aggs_data_clean_(data)
             df['ticker'] = ticker.upper()
             return df
         
-    def get_aggs_forex(self, pairs):
-        url = f'{self.base_url}historical-price-full/{pairs.upper()}?from=2000-01-01&to=2025-01-01&apikey={self.api_key}'
+    def get_aggs_forex(self, pairs, start='2000-01-01', finish='2025-01-01'):
+        url = f'{self.base_url}historical-price-full/{pairs.upper()}?from={start}&to={finish}&apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
+        elif not data.get('historical'):
+            return "ERROR! no bars in range; check request parameters"
         else:
             df = self.utils.aggs_data_clean_(data)
             df.drop(columns=[
@@ -368,11 +1305,13 @@ class FmpClient:
             df['ticker'] = pairs.upper()
             return df
         
-    def get_aggs_index(self, pairs):
-        url = f'{self.base_url}historical-price-full/{pairs.upper()}?from=2000-01-01&to=2025-01-01&apikey={self.api_key}'
+    def get_aggs_index(self, pairs, start='2000-01-01', finish='2025-01-01'):
+        url = f'{self.base_url}historical-price-full/{pairs.upper()}?from={start}&to={finish}&apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
+        elif not data.get('historical'):
+            return "ERROR! no bars in range; check request parameters"
         else:
             df = self.utils.aggs_data_clean_(data)
             df.drop(columns=[
@@ -381,11 +1320,53 @@ class FmpClient:
             df['ticker'] = pairs.upper()
             return df
 
+    def refresh_aggs(self, db, table_name, tickers, kind='stock'):
+        # only asks for bars after the latest stored date per ticker, so a
+        # daily rerun moves a few rows instead of the whole 2000+ history.
+        # returns (added, errors) like fetch_many; an empty range after
+        # stored history counts as 0 added, any other failure is an error
+        fetch = {
+            'stock': self.get_aggs,
+            'forex': self.get_aggs_forex,
+            'index': self.get_aggs_index
+        }[kind]
+        last_dates = db.get_last_dates(table_name)
+        today = pd.Timestamp.today().normalize()
+        added = {}
+        errors = {}
+        for i in tickers:
+            symbol = (i['symbol'] if isinstance(i, dict) else i).upper()
+            last = last_dates.get(symbol)
+            if last is None:
+                start = '2000-01-01'
+            elif last >= today:
+                added[symbol] = 0
+                continue
+            else:
+                start = (last + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            try:
+                df = fetch(symbol, start, today.strftime('%Y-%m-%d'))
+            except Exception as e:
+                df = f"ERROR! {type(e).__name__}: {e}"
+            if isinstance(df, str):
+                if last is not None and df.startswith('ERROR! no bars in range'):
+                    # nothing new since the last run (weekend, holiday)
+                    added[symbol] = 0
+                else:
+                    errors[symbol] = df
+                continue
+            if last is not None:
+                df = df[df['date'] > last]
+            if not df.empty:
+                db.data_add(df, table_name)
+            added[symbol] = len(df)
+        return added, errors
+
     def get_price_rt(self, ticker):
         url = f'{self.base_url}quote-short/{ticker.upper()}?apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             return df
@@ -393,8 +1374,8 @@ class FmpClient:
     def get_market_cap_rt(self, ticker, human=False):
         url = f'{self.base_url}market-capitalization/{ticker.upper()}?from=2000-01-01&to-2025-01-01&apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             df.drop(columns=['date'], inplace=True)
@@ -408,8 +1389,8 @@ class FmpClient:
     def get_market_cap_range(self, ticker, start, finish):
         url = f'{self.base_url}historical-market-capitalization/{ticker.upper()}?&from={start}&to={finish}&apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             df.rename(columns={'marketCap':'market_cap'}, inplace=True)
@@ -444,8 +1425,8 @@ class FmpClient:
     def get_snp_companies(self):
         url = f'{self.base_url}sp500_constituent?apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             df.drop(columns='cik', inplace=True)
@@ -459,8 +1440,8 @@ class FmpClient:
     def get_dow_companies(self):
         url = f'{self.base_url}dowjones_constituent?apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             df.drop(columns='cik', inplace=True)
@@ -474,8 +1455,8 @@ class FmpClient:
     def get_nasdaq_companies(self):
         url = f'{self.base_url}nasdaq_constituent?apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = pd.DataFrame(data)
             df.drop(columns='cik', inplace=True)
@@ -488,56 +1469,65 @@ class FmpClient:
 
     ##############################
 
+    def url_(self, endpoint, ticker):
+        path = self.statements[endpoint][0].format(ticker=ticker.upper())
+        return f'{self.base_url}{path}&apikey={self.api_key}'
+
+    def get_raw(self, endpoint, ticker):
+        # the json payload of a statement endpoint without the cleaning, for
+        # callers that clean somewhere else (CleaningPipeline)
+        return self.utils.request_(self.url_(endpoint, ticker))
+
     def get_income_statement_a(self, ticker):
-        url = f'{self.base_url}income-statement/{ticker.upper()}?period=annual&apikey={self.api_key}'
+        url = self.url_('get_income_statement_a', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.income_statement_data_clean_(data)
             return df  
         
     def get_income_statement_q(self, ticker):
-        url = f'{self.base_url}income-statement/{ticker.upper()}?period=quarter&apikey={self.api_key}'
+        url = self.url_('get_income_statement_q', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.income_statement_data_clean_(data)
             return df
     
     def get_balance_sheet_a(self, ticker):
-        url = f'{self.base_url}balance-sheet-statement/{ticker.upper()}?period=annual&apikey={self.api_key}'
+        url = self.url_('get_balance_sheet_a', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.balance_sheet_data_clean_(data)
             return df
     
     def get_balance_sheet_q(self, ticker):
-        url = f'{self.base_url}balance-sheet-statement/{ticker.upper()}?period=quarter&apikey={self.api_key}'
+        url = self.url_('get_balance_sheet_q', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.balance_sheet_data_clean_(data)
             return df
         
     def get_cash_flow_a(self, ticker):
-        url = f'{self.base_url}cash-flow-statement/{ticker.upper()}?period=annual&apikey={self.api_key}'
+        url = self.url_('get_cash_flow_a', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.cash_flow_data_clean_(data)
             return df
         
     def get_cash_flow_q(self, ticker):
-        url = f'{self.base_url}cash-flow-statement/{ticker.upper()}?period=quarter&apikey={self.api_key}'
+        url = self.url_('get_cash_flow_q', ticker)
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.cash_flow_data_clean_(data)
             return df
@@ -545,8 +1535,8 @@ class FmpClient:
     def get_dividend(self, ticker):
         url = f'{self.base_url}historical-price-full/stock_dividend/{ticker.upper()}?apikey={self.api_key}'
         data = self.utils.request_(url)
-        if data == "ERROR! dictionary empty; check request parameters":
-            return "ERROR! dictionary empty; check initial request"
+        if isinstance(data, str):
+            return data
         else:
             df = self.utils.dividend_data_clean_(data)
             if isinstance(df, str):
@@ -555,4 +1545,44 @@ class FmpClient:
                 df['symbol'] = ticker
                 return df
         
-    ##############################
\ No newline at end of file
+    ##############################
+
+    async def fetch_many_async(self, endpoint, tickers, concurrency=8):
+        # endpoint is the name of any single-ticker get_* method, e.g.
+        # 'get_income_statement_q'; yields (ticker, result) as each finishes
+        method = getattr(self, endpoint)
+        symbols = [i['symbol'] if isinstance(i, dict) else i for i in tickers]
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            async def fetch_(symbol):
+                try:
+                    data = await loop.run_in_executor(pool, method, symbol)
+                except Exception as e:
+                    data = f"ERROR! {type(e).__name__}: {e}"
+                return symbol, data
+
+            for task in asyncio.as_completed([fetch_(i) for i in symbols]):
+                yield await task
+
+    def fetch_many(self, endpoint, tickers, concurrency=8):
+        # only "ERROR! ..." strings are errors; other strings (get_dividend's
+        # "no div") are results, as the single-ticker method returns them
+        results = {}
+        errors = {}
+
+        async def collect_():
+            async for symbol, data in self.fetch_many_async(endpoint, tickers, concurrency):
+                if isinstance(data, str) and data.startswith('ERROR!'):
+                    errors[symbol] = data
+                else:
+                    results[symbol] = data
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(collect_())
+        else:
+            # already inside an event loop (jupyter), so run on a side thread
+            with ThreadPoolExecutor(max_workers=1) as runner:
+                runner.submit(asyncio.run, collect_()).result()
+        return results, errors
@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+try:
+    from sklearn import metrics
+    from sklearn.base import clone, is_classifier
+    from sklearn.model_selection import TimeSeriesSplit
+except ImportError:
+    metrics = None
+
+from finpy_backtest import Backtester
+
+
+# worker side of WalkForward; each process attaches to the shared blocks once
+# in its initializer and every fold task then slices them without a copy
+shared_ = {}
+
+
+def attach_shared_(estimator, blocks):
+    shared_['estimator'] = estimator
+    shared_['handles'] = []
+    for name, (shm_name, shape, dtype) in blocks.items():
+        # the parent owns the block and unlinks it once the pool is done
+        shm = shared_memory.SharedMemory(name=shm_name)
+        shared_['handles'].append(shm)
+        shared_[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def fit_fold_(ticker, start, stop, fold, n_splits):
+    X = shared_['X'][start:stop]
+    y = shared_['y'][start:stop]
+    dates = shared_['dates'][start:stop]
+    train, test = list(TimeSeriesSplit(n_splits=n_splits).split(X))[fold]
+    model = clone(shared_['estimator'])
+    model.fit(X[train], y[train])
+    y_pred = model.predict(X[test])
+    row = {
+        'ticker': ticker,
+        'fold': fold,
+        'train_start': dates[train[0]],
+        'train_end': dates[train[-1]],
+        'test_start': dates[test[0]],
+        'test_end': dates[test[-1]],
+        'n_train': len(train),
+        'n_test': len(test)
+    }
+    if is_classifier(model):
+        row['accuracy'] = metrics.accuracy_score(y[test], y_pred)
+        row['precision'] = metrics.precision_score(y[test], y_pred, average='macro', zero_division=0)
+        row['recall'] = metrics.recall_score(y[test], y_pred, average='macro', zero_division=0)
+        row['f1'] = metrics.f1_score(y[test], y_pred, average='macro', zero_division=0)
+        if hasattr(model, 'predict_proba') and len(model.classes_) == 2 and len(np.unique(y[test])) == 2:
+            row['roc_auc'] = metrics.roc_auc_score(y[test], model.predict_proba(X[test])[:, 1])
+    else:
+        row['r2'] = metrics.r2_score(y[test], y_pred)
+        row['mae'] = metrics.mean_absolute_error(y[test], y_pred)
+        row['rmse'] = np.sqrt(metrics.mean_squared_error(y[test], y_pred))
+    return row
+
+
+def add_columns_(db, table_name, row):
+    # results tables gain whatever columns a new row brings (metrics differ
+    # by estimator, an error row has none) instead of failing the insert
+    if table_name not in db.get_table_names()['name'].tolist():
+        return
+    columns = [i[1] for i in db.conn.execute(f'PRAGMA table_info("{table_name}")')]
+    for name, value in row.items():
+        if name not in columns:
+            kind = 'REAL' if isinstance(value, (int, float, np.number)) else 'TEXT'
+            db.conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{name}" {kind}')
+    db.conn.commit()
+
+
+class WalkForward:
+    # every run reports all of these, nan where the estimator has no such
+    # score, so classifiers and regressors share one results table
+    metric_columns = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc', 'r2', 'mae', 'rmse']
+
+    def __init__(self, estimator, features, target, n_splits=5, workers=None, min_rows=50):
+        # estimator is any sklearn-compatible model; each (ticker, fold) is
+        # fitted on a fresh clone with TimeSeriesSplit folds over that
+        # ticker's rows in date order. tickers with fewer than min_rows
+        # usable rows are skipped
+        if metrics is None:
+            raise ImportError("WalkForward requires scikit-learn")
+        self.estimator = estimator
+        self.features = list(features)
+        self.target = target
+        self.n_splits = n_splits
+        self.workers = workers
+        self.min_rows = min_rows
+
+    def share_(self, arrays):
+        blocks = {}
+        handles = []
+        for name, array in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+            blocks[name] = (shm.name, array.shape, array.dtype.str)
+            handles.append(shm)
+        return blocks, handles
+
+    def prepare(self, frame):
+        # frame is a long feature table (ticker, date, features..., target);
+        # returns the model arrays in (ticker, date) order and one task per
+        # (ticker, fold) as slice bounds into them
+        frame = frame.dropna(subset=self.features + [self.target])
+        frame = frame.sort_values(['ticker', 'date'], kind='stable')
+        y = frame[self.target]
+        self.classes_ = None
+        if not pd.api.types.is_numeric_dtype(y):
+            # labels like 'up'/'down' would put object pointers in the shared
+            # block; workers see integer codes, classes_[code] is the label
+            codes, self.classes_ = pd.factorize(y, sort=True)
+            y = pd.Series(codes, index=y.index)
+        arrays = {
+            'X': np.ascontiguousarray(frame[self.features].to_numpy(dtype='float64')),
+            'y': y.to_numpy(),
+            'dates': frame['date'].to_numpy(dtype='datetime64[ns]')
+        }
+        tickers = frame['ticker'].to_numpy()
+        bounds = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1], True])
+        tasks = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop - start < max(self.min_rows, self.n_splits + 1):
+                continue
+            for fold in range(self.n_splits):
+                tasks.append((tickers[start], int(start), int(stop), fold, self.n_splits))
+        return arrays, tasks
+
+    def run(self, frame):
+        # the feature matrix is copied into shared memory once; workers map
+        # it instead of receiving a pickled slice per task
+        arrays, tasks = self.prepare(frame)
+        if not tasks:
+            return "ERROR! no ticker has enough rows; check features and min_rows"
+        blocks, handles = self.share_(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_shared_,
+                                     initargs=(self.estimator, blocks)) as pool:
+                rows = list(pool.map(fit_fold_, *zip(*tasks), chunksize=max(len(tasks) // 64, 1)))
+        finally:
+            for shm in handles:
+                shm.close()
+                shm.unlink()
+        results = pd.DataFrame(rows)
+        results = results.reindex(columns=[i for i in results.columns if i not in self.metric_columns] + self.metric_columns)
+        results.insert(0, 'model', type(self.estimator).__name__)
+        # a plain list; pandas compares attrs when frames are printed or concatenated
+        results.attrs['classes'] = None if self.classes_ is None else list(self.classes_)
+        return results
+
+    def run_table(self, db, table_name='features', results_table='model_results', sql_string=None):
+        # reads the feature table from a DataBaseClient and appends the fold
+        # metrics to results_table, stamped with the run time
+        frame = db.data_query(sql_string or f"SELECT * FROM {table_name}")
+        results = self.run(frame)
+        if isinstance(results, str):
+            return results
+        results.insert(1, 'run_at', pd.Timestamp.now().floor('s'))
+        # tables written before every metric column was reported
+        add_columns_(db, results_table, results.iloc[0].to_dict())
+        db.data_add(results, results_table)
+        return results
+
+
+# worker side of SweepRunner; the arrays are opened as read-only memmaps once
+# per process and every configuration evaluated there reads the same pages
+mapped_ = {}
+
+
+def map_arrays_(paths, context):
+    mapped_['arrays'] = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+    mapped_['context'] = context
+
+
+def run_config_(evaluate, config):
+    return evaluate(mapped_['arrays'], mapped_['context'], config)
+
+
+def backtest_config_(arrays, context, config):
+    # context and config are both Backtester arguments, e.g. context
+    # {'execution': 'open'} and config {'threshold': 0.5, 'cost_bps': 5}
+    bt = Backtester(**{**context, **config})
+    daily, holdings = bt.run_arrays(arrays['signal'], arrays['close'], arrays.get('open'))
+    return bt.summary(pd.DataFrame(daily))
+
+
+def walk_forward_config_(arrays, context, config):
+    # context holds the estimator, feature names and WalkForward tasks;
+    # config is estimator hyperparameters plus an optional 'features'
+    # subset. fold metrics are averaged over every (ticker, fold)
+    config = dict(config)
+    X = arrays['X']
+    if 'features' in config:
+        X = X[:, [context['features'].index(i) for i in config.pop('features')]]
+    shared_.update(X=X, y=arrays['y'], dates=arrays['dates'])
+    shared_['estimator'] = clone(context['estimator']).set_params(**config)
+    rows = pd.DataFrame([fit_fold_(*task) for task in context['tasks']])
+    scores = rows.drop(columns=['ticker', 'fold', 'train_start', 'train_end', 'test_start', 'test_end', 'n_train', 'n_test'])
+    return scores.mean().to_dict()
+
+
+class SweepRunner:
+    def __init__(self, evaluate, grid, context=None, workers=None, rank_by='sharpe', ascending=False):
+        # evaluate is a module-level function (arrays, context, config) ->
+        # dict of metrics, e.g. backtest_config_ or walk_forward_config_.
+        # grid is either a dict of lists (full product) or a list of config
+        # dicts; context is passed once to every worker
+        self.evaluate = evaluate
+        self.grid = grid
+        self.context = context or {}
+        self.workers = workers
+        self.rank_by = rank_by
+        self.ascending = ascending
+
+    def configs_(self):
+        if isinstance(self.grid, dict):
+            keys = list(self.grid)
+            return [dict(zip(keys, values)) for values in itertools.product(*self.grid.values())]
+        return [dict(i) for i in self.grid]
+
+    def key_(self, config):
+        return json.dumps(config, sort_keys=True, default=str)
+
+    def done_(self, db, table_name, sweep_id):
+        # configs that errored are not done; they are evaluated again
+        if db is None or table_name not in db.get_table_names()['name'].tolist():
+            return pd.DataFrame()
+        return db.data_query(f'SELECT * FROM "{table_name}" WHERE sweep_id = ? AND error IS NULL', [sweep_id])
+
+    def run(self, arrays, db=None, table_name='sweep_results', sweep_id='default', mmap_dir=None):
+        # arrays is a dict of numpy arrays (Backtester.panel output, or
+        # WalkForward.prepare output). they are saved as .npy files once and
+        # memory-mapped by the workers; each finished configuration is
+        # upserted to table_name keyed on (sweep_id, config), so rerunning an
+        # interrupted sweep only evaluates what is missing
+        objects = [name for name, array in arrays.items() if np.asarray(array).dtype.hasobject]
+        if objects:
+            # np.load can't memory-map object arrays; encode them first
+            # (WalkForward.prepare already factorizes string targets)
+            raise ValueError(f"object arrays can't be memory-mapped: {', '.join(objects)}")
+        done = self.done_(db, table_name, sweep_id)
+        finished = set(done['config']) if len(done) else set()
+        pending = [i for i in self.configs_() if self.key_(i) not in finished]
+        rows = []
+        if pending:
+            root = mmap_dir or tempfile.mkdtemp(prefix='finpy_sweep_')
+            os.makedirs(root, exist_ok=True)
+            paths = {}
+            for name, array in arrays.items():
+                paths[name] = os.path.join(root, f'{name}.npy')
+                np.save(paths[name], np.asarray(array))
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=map_arrays_,
+                                         initargs=(paths, self.context)) as pool:
+                    futures = {pool.submit(run_config_, self.evaluate, i): i for i in pending}
+                    for future in as_completed(futures):
+                        row = {'sweep_id': sweep_id, 'config': self.key_(futures[future]), 'error': None}
+                        try:
+                            row.update(future.result())
+                        except Exception as e:
+                            row['error'] = f"ERROR! {type(e).__name__}: {e}"
+                        rows.append(row)
+                        if db is not None:
+                            add_columns_(db, table_name, row)
+                            db.upsert(pd.DataFrame([row]), table_name, key=['sweep_id', 'config'])
+            finally:
+                if mmap_dir is None:
+                    shutil.rmtree(root, ignore_errors=True)
+        results = pd.concat([done, pd.DataFrame(rows)], ignore_index=True)
+        return self.ranked(results)
+
+    def ranked(self, results):
+        if self.rank_by not in results.columns:
+            return results
+        results = results.sort_values(self.rank_by, ascending=self.ascending, na_position='last', ignore_index=True)
+        results.insert(0, 'rank', results[self.rank_by].rank(ascending=self.ascending, method='min'))
+        return results